@@ -9,12 +9,16 @@ from aws_cdk.aws_apigatewayv2 import HttpApi, HttpMethod, \
     CorsPreflightOptions, DomainMappingOptions, HttpStage, \
     DomainName, HttpAuthorizer
 from aws_cdk.aws_certificatemanager import Certificate, ValidationMethod
-from aws_cdk.aws_dynamodb import Table, Attribute, AttributeType, BillingMode
+from aws_cdk.aws_dynamodb import Table, Attribute, AttributeType, BillingMode, \
+    ProjectionType
 from aws_cdk.aws_events import Schedule, Rule
 from aws_cdk.aws_iam import Role, ServicePrincipal, PolicyStatement, \
     ManagedPolicy
 from aws_cdk.aws_lambda import LayerVersion, Code, Runtime, Function
+from aws_cdk.aws_lambda_event_sources import SqsEventSource
 from aws_cdk.aws_sns import Topic
+from aws_cdk.aws_sns_subscriptions import SqsSubscription
+from aws_cdk.aws_sqs import Queue, DeadLetterQueue
 from aws_cdk.core import Duration
 from aws_cdk.aws_events_targets import LambdaFunction
 
@@ -35,6 +39,7 @@ class Shows(core.Stack):
         self.lambdas = {}
         self._create_tables()
         self._create_topic()
+        self._create_queues()
         self._create_lambdas_config()
         self._create_layers()
         self._create_lambdas()
@@ -53,6 +58,15 @@ class Shows(core.Stack):
                                     type=AttributeType.NUMBER),
             index_name="tvmaze_id"
         )
+        # Scanned by the update planner, only the few attributes it needs
+        # instead of whole show items with their snapshots
+        self.shows_table.add_global_secondary_index(
+            partition_key=Attribute(name="tvmaze_id",
+                                    type=AttributeType.NUMBER),
+            index_name="tvmaze_tracked",
+            projection_type=ProjectionType.INCLUDE,
+            non_key_attributes=["tvmaze_updated", "tvmaze_ttl"],
+        )
 
         self.episodes_table = Table(
             self,
@@ -79,28 +93,68 @@ class Shows(core.Stack):
             topic_name="shows-updates",
         )
 
+    def _create_queues(self):
+        self.refresh_queue = Queue(
+            self,
+            "refresh_queue",
+            queue_name="shows-refresh",
+            visibility_timeout=Duration.seconds(6 * 60),
+            dead_letter_queue=DeadLetterQueue(
+                max_receive_count=3,
+                queue=Queue(
+                    self,
+                    "refresh_dead_letter_queue",
+                    queue_name="shows-refresh-dlq",
+                )
+            )
+        )
+        self.show_updates_topic.add_subscription(
+            SqsSubscription(self.refresh_queue, raw_message_delivery=True)
+        )
+
+        self.updates_queue = Queue(
+            self,
+            "updates_queue",
+            queue_name="shows-update-chunks",
+            visibility_timeout=Duration.seconds(6 * 60),
+            dead_letter_queue=DeadLetterQueue(
+                max_receive_count=3,
+                queue=Queue(
+                    self,
+                    "updates_dead_letter_queue",
+                    queue_name="shows-update-chunks-dlq",
+                )
+            )
+        )
+
     def _create_lambdas_config(self):
         self.lambdas_config = {
             "api-shows_by_id": {
-                "layers": ["utils", "databases", "api"],
+                "layers": ["utils", "databases", "api", "publishers"],
                 "variables": {
                     "SHOWS_DATABASE_NAME": self.shows_table.table_name,
                     "LOG_LEVEL": "INFO",
+                    "REFRESH_QUEUE_URL": self.refresh_queue.queue_url,
                 },
                 "policies": [
                     PolicyStatement(
-                        actions=["dynamodb:GetItem"],
+                        actions=["dynamodb:GetItem", "dynamodb:UpdateItem"],
                         resources=[self.shows_table.table_arn]
-                    )
+                    ),
+                    PolicyStatement(
+                        actions=["sqs:SendMessage"],
+                        resources=[self.refresh_queue.queue_arn],
+                    ),
                 ],
                 "timeout": 3,
                 "memory": 128
             },
             "api-shows": {
-                "layers": ["utils", "databases", "api"],
+                "layers": ["utils", "databases", "api", "publishers"],
                 "variables": {
                     "SHOWS_DATABASE_NAME": self.shows_table.table_name,
                     "LOG_LEVEL": "INFO",
+                    "REFRESH_QUEUE_URL": self.refresh_queue.queue_url,
                 },
                 "policies": [
                     PolicyStatement(
@@ -109,9 +163,13 @@ class Shows(core.Stack):
                             f"{self.shows_table.table_arn}/index/tvmaze_id"]
                     ),
                     PolicyStatement(
-                        actions=["dynamodb:UpdateItem"],
+                        actions=["dynamodb:UpdateItem", "dynamodb:BatchGetItem"],
                         resources=[self.shows_table.table_arn]
                     ),
+                    PolicyStatement(
+                        actions=["sqs:SendMessage"],
+                        resources=[self.refresh_queue.queue_arn],
+                    ),
                 ],
                 "timeout": 10,
                 "memory": 128
@@ -134,11 +192,11 @@ class Shows(core.Stack):
                             f"{self.episodes_table.table_arn}/index/tvmaze_id"]
                     ),
                     PolicyStatement(
-                        actions=["dynamodb:UpdateItem"],
+                        actions=["dynamodb:UpdateItem", "dynamodb:BatchWriteItem"],
                         resources=[self.episodes_table.table_arn]
                     ),
                     PolicyStatement(
-                        actions=["dynamodb:GetItem"],
+                        actions=["dynamodb:GetItem", "dynamodb:Query"],
                         resources=[self.episodes_table.table_arn]
                     ),
                 ],
@@ -165,20 +223,68 @@ class Shows(core.Stack):
                 "variables": {
                     "SHOWS_DATABASE_NAME": self.shows_table.table_name,
                     "LOG_LEVEL": "INFO",
-                    "UPDATES_TOPIC_ARN": self.show_updates_topic.topic_arn,
+                    "UPDATES_QUEUE_URL": self.updates_queue.queue_url,
+                },
+                "policies": [
+                    PolicyStatement(
+                        actions=["dynamodb:Scan"],
+                        resources=[f"{self.shows_table.table_arn}/index/tvmaze_tracked"],
+                    ),
+                    PolicyStatement(
+                        actions=["dynamodb:GetItem", "dynamodb:UpdateItem"],
+                        resources=[self.shows_table.table_arn],
+                    ),
+                    PolicyStatement(
+                        actions=["sqs:SendMessage"],
+                        resources=[self.updates_queue.queue_arn],
+                    )
+                ],
+                "timeout": 60,
+                "memory": 1024
+            },
+            "events-refresh_shows": {
+                "layers": ["utils", "databases", "api"],
+                "variables": {
+                    "SHOWS_DATABASE_NAME": self.shows_table.table_name,
+                    "SHOW_EPISODES_DATABASE_NAME": self.episodes_table.table_name,
+                    "LOG_LEVEL": "INFO",
                 },
                 "policies": [
                     PolicyStatement(
                         actions=["dynamodb:Query"],
                         resources=[f"{self.shows_table.table_arn}/index/tvmaze_id"],
                     ),
+                    PolicyStatement(
+                        actions=["dynamodb:UpdateItem"],
+                        resources=[self.shows_table.table_arn],
+                    ),
+                    PolicyStatement(
+                        actions=["dynamodb:Query", "dynamodb:BatchWriteItem"],
+                        resources=[self.episodes_table.table_arn],
+                    ),
+                ],
+                "timeout": 60,
+                "memory": 256
+            },
+            "cron-update_eps_worker": {
+                "layers": ["utils", "databases", "publishers"],
+                "variables": {
+                    "SHOWS_DATABASE_NAME": self.shows_table.table_name,
+                    "LOG_LEVEL": "INFO",
+                    "UPDATES_TOPIC_ARN": self.show_updates_topic.topic_arn,
+                },
+                "policies": [
+                    PolicyStatement(
+                        actions=["dynamodb:UpdateItem"],
+                        resources=[self.shows_table.table_arn],
+                    ),
                     PolicyStatement(
                         actions=["sns:Publish"],
                         resources=[self.show_updates_topic.topic_arn],
                     )
                 ],
                 "timeout": 60,
-                "memory": 1024
+                "memory": 256
             },
         }
 
@@ -254,11 +360,28 @@ class Shows(core.Stack):
         Rule(
             self,
             "update_eps",
-            schedule=Schedule.cron(hour="2", minute="10"),
+            schedule=Schedule.cron(hour="2,14", minute="10"),
             targets=[
                 LambdaFunction(self.lambdas["cron-update_eps"])]
         )
 
+        self.lambdas["events-refresh_shows"].add_event_source(
+            SqsEventSource(
+                self.refresh_queue,
+                batch_size=10,
+                max_batching_window=Duration.seconds(30),
+                report_batch_item_failures=True,
+            )
+        )
+
+        self.lambdas["cron-update_eps_worker"].add_event_source(
+            SqsEventSource(
+                self.updates_queue,
+                batch_size=1,
+                report_batch_item_failures=True,
+            )
+        )
+
     def _create_gateway(self):
         cert = Certificate(
             self,
@@ -311,6 +434,11 @@ class Shows(core.Stack):
                 "route": "/shows/{id}/episodes",
                 "target_lambda": self.lambdas["api-episodes"]
             },
+            "get_show_episodes": {
+                "method": "GET",
+                "route": "/shows/{id}/episodes",
+                "target_lambda": self.lambdas["api-episodes"]
+            },
             "get_episodes_by_id": {
                 "method": "GET",
                 "route": "/shows/{id}/episodes/{episode_id}",
@@ -2,11 +2,16 @@ import json
 import os
 from json import JSONDecodeError
 
-import decimal_encoder
+import concurrency
+import deadline
+import episode_sync
 import episodes_db
 import logger
+import metrics
+import responses
 import schema
 import shows_db
+import snapshots
 import tvmaze
 
 sqs_queue = None
@@ -15,6 +20,10 @@ log = logger.get_logger("show")
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 POST_SCHEMA_PATH = os.path.join(CURRENT_DIR, "post.json")
+IO_TIMEOUT = 8
+MAX_PAGE_LIMIT = 100
+# mode query parameter value answering from episodes_db only
+LITE_MODE = "lite"
 
 tvmaze_api = tvmaze.TvMazeApi()
 
@@ -27,126 +36,186 @@ class UnsupportedMethod(Error):
     pass
 
 
+@metrics.handler("episodes")
 def handle(event, context):
-    log.debug(f"Received event: {event}")
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
 
     method = event["requestContext"]["http"]["method"]
 
-    if method == "POST":
-        show_id = event.get("pathParameters", {})
-        body = event.get("body")
-        return _post_episode(show_id, body)
-    elif method == "GET":
-        query_params = event.get("queryStringParameters")
-        return _get_episode_by_api_id(query_params)
-    else:
-        raise UnsupportedMethod()
+    try:
+        if method == "POST":
+            show_id = event.get("pathParameters", {})
+            body = event.get("body")
+            return _post_episode(show_id, body)
+        elif method == "GET":
+            query_params = event.get("queryStringParameters")
+            path_params = event.get("pathParameters") or {}
+            if "id" in path_params:
+                return _get_show_episodes(path_params["id"], query_params or {})
+            return _get_episode_by_api_id(query_params)
+        else:
+            raise UnsupportedMethod()
+    except deadline.DeadlineExceeded:
+        log.warning("Deadline exceeded for %s request", method)
+        return responses.response(504)
 
 
 def _post_episode(path_params, body):
     if "id" not in path_params:
-        return {
-            "statusCode": 400,
-            "body": "Missing id query param"
-        }
+        return responses.response(400, "Missing id query param")
 
     show_id = path_params["id"]
 
-    try:
-        shows_db.get_show_by_id(show_id)
-    except shows_db.NotFoundError:
-        return {
-            "statusCode": 404,
-            "body": json.dumps({"message": "Show not found"})
-        }
-
     try:
         body = json.loads(body)
     except (TypeError, JSONDecodeError):
-        log.debug(f"Invalid body: {body}")
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"message": "Invalid post body"})
-        }
+        log.debug("Invalid body: %s", body)
+        return responses.response(400, {"message": "Invalid post body"})
 
     try:
         schema.validate_schema(POST_SCHEMA_PATH, body)
     except schema.ValidationException as e:
-        return {"statusCode": 400, "body": json.dumps(
-            {"message": "Invalid post schema", "error": str(e)})}
+        return responses.response(400, {"message": "Invalid post schema", "error": str(e)})
 
     if body["api_name"] == "tvmaze":
+        if "api_ids" in body:
+            return _post_tvmaze_bulk(show_id, body["api_ids"])
+        if body.get("all_episodes"):
+            return _post_tvmaze_bulk(show_id)
         return _post_tvmaze(show_id, body["api_id"])
 
 
 def _post_tvmaze(show_id, tvmaze_id):
     try:
-        api_res = tvmaze_api.get_episode(tvmaze_id)
+        _, api_res, res = concurrency.run_parallel(
+            lambda: shows_db.get_show_by_id(show_id),
+            lambda: tvmaze_api.get_episode(tvmaze_id),
+            lambda: _get_existing_episode(tvmaze_id),
+            timeout=deadline.timeout(IO_TIMEOUT),
+        )
+    except shows_db.NotFoundError:
+        return responses.response(404, {"message": "Show not found"})
     except tvmaze.HTTPError as e:
-        return {
-            "statusCode": e.code
-        }
+        return responses.response(e.code)
+    except concurrency.TimeoutError:
+        return responses.response(504)
 
-    try:
-        res = episodes_db.get_episode_by_api_id("tvmaze", int(tvmaze_id))
-        res["is_special"] = api_res["type"] != "regular"
-    except episodes_db.NotFoundError:
-        episodes_db.new_episode(show_id, "tvmaze", int(tvmaze_id))
+    fields = tvmaze.episode_fields(api_res)
+    if res is None:
+        episodes_db.new_episode(show_id, "tvmaze", int(tvmaze_id), fields)
         res = {
             "tvmaze_id": tvmaze_id,
-            "id": episodes_db.create_episode_uuid(show_id, tvmaze_id)
+            "id": episodes_db.create_episode_uuid(show_id, tvmaze_id),
+            **fields,
         }
     else:
-        return {
-            "statusCode": 200,
-            "body": json.dumps({**res, "tvmaze_data": { **api_res }}, cls=decimal_encoder.DecimalEncoder),
-        }
+        # Episodes stored before their fields were persisted are filled in
+        changed = {k: v for k, v in fields.items() if res.get(k) != v}
+        if changed:
+            episodes_db.update_episode(res["show_id"], res["id"], changed)
+        res = {**episode_sync.strip_episode(res), **fields}
+
+    return responses.response(200, {**res, "tvmaze_data": { **api_res }})
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps({**res, "tvmaze_data": { **api_res }}, cls=decimal_encoder.DecimalEncoder),
-    }
+
+def _post_tvmaze_bulk(show_id, tvmaze_ids=None):
+    try:
+        show = shows_db.get_show_by_id(show_id)
+    except shows_db.NotFoundError:
+        return responses.response(404, {"message": "Show not found"})
+
+    if "tvmaze_id" not in show:
+        return responses.response(400, {"message": "Show has no tvmaze_id"})
+
+    try:
+        api_res = tvmaze_api.get_show_episodes(show["tvmaze_id"], cached=False)
+    except tvmaze.HTTPError as e:
+        return responses.response(e.code)
+
+    show_episodes = {e["id"]: e for e in api_res}
+    if tvmaze_ids is None:
+        tvmaze_ids = list(show_episodes)
+        not_found = []
+    else:
+        tvmaze_ids = list(dict.fromkeys(int(i) for i in tvmaze_ids))
+        not_found = [str(i) for i in tvmaze_ids if i not in show_episodes]
+        tvmaze_ids = [i for i in tvmaze_ids if i in show_episodes]
+
+    # Only episodes that are new or changed since the last sync are written,
+    # existing items keep their stored fields and content hash
+    episode_sync.sync_episodes(show_id, "tvmaze", [show_episodes[i] for i in tvmaze_ids])
+    episode_ids = [episodes_db.create_episode_uuid(show_id, str(i)) for i in tvmaze_ids]
+
+    return responses.response(200, {
+        "episodes": [{"id": e, "tvmaze_id": t} for e, t in zip(episode_ids, tvmaze_ids)],
+        "not_found": not_found,
+    })
+
+
+def _get_show_episodes(show_id, query_params):
+    try:
+        limit = int(query_params.get("limit", MAX_PAGE_LIMIT))
+    except ValueError:
+        limit = 0
+
+    if not 0 < limit <= MAX_PAGE_LIMIT:
+        return responses.response(400, {"error": f"limit must be between 1 and {MAX_PAGE_LIMIT}"})
+
+    cursor = query_params.get("cursor")
+    try:
+        items, next_cursor = episodes_db.get_episodes_page(show_id, limit, cursor)
+    except episodes_db.InvalidCursorError:
+        return responses.response(400, {"error": "Invalid cursor"})
+
+    if not items and cursor is None:
+        try:
+            shows_db.get_show_by_id(show_id)
+        except shows_db.NotFoundError:
+            return responses.response(404, {"message": "Show not found"})
+
+    episodes = [episode_sync.strip_episode(i) for i in items]
+    return responses.response(200, {"episodes": episodes, "cursor": next_cursor})
+
+
+def _get_existing_episode(tvmaze_id):
+    try:
+        return episodes_db.get_episode_by_api_id("tvmaze", int(tvmaze_id))
+    except episodes_db.NotFoundError:
+        return None
 
 
 def _get_episode_by_api_id(query_params):
     if not query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Please specify query parameters"})
-        }
+        return responses.response(400, {"error": "Please specify query parameters"})
 
     if "api_id" not in query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing api_id query parameter"})
-        }
+        return responses.response(400, {"error": "Missing api_id query parameter"})
 
     if "api_name" not in query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing api_name query parameter"})
-        }
+        return responses.response(400, {"error": "Missing api_name query parameter"})
 
     api_id = int(query_params["api_id"])
     api_name = query_params["api_name"]
 
     if api_name in ["tvmaze"]:
         try:
-            res = episodes_db.get_episode_by_api_id(api_name, api_id)
-            api_res = tvmaze_api.get_episode(res["tvmaze_id"])
+            res = episode_sync.strip_episode(episodes_db.get_episode_by_api_id(api_name, api_id))
+            if query_params.get("mode") == LITE_MODE:
+                # Stored fields only, without a tvmaze call
+                return responses.response(200, episode_sync.lite_episode(res))
+
+            api_res, stale = snapshots.get_tvmaze_episode(tvmaze_api, res["tvmaze_id"])
             res["is_special"] = api_res["type"] != "regular"
 
             res = {**res, "tvmaze_data": {**api_res}}
-            return {
-                "statusCode": 200,
-                "body": json.dumps(res, cls=decimal_encoder.DecimalEncoder)
-            }
+            if stale:
+                res["tvmaze_data_stale"] = True
+            return responses.response(200, res)
         except (episodes_db.NotFoundError, episodes_db.InvalidAmountOfEpisodes):
-            return {"statusCode": 404}
+            return responses.response(404)
         except tvmaze.HTTPError as e:
-            return {"statusCode": e.code}
+            return responses.response(e.code)
     else:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Unsupported api_name"})
-        }
+        return responses.response(400, {"error": "Unsupported api_name"})
@@ -1,12 +1,17 @@
-import json
-
+import episode_sync
 import episodes_db
-import decimal_encoder
+import deadline
 import logger
+import metrics
+import responses
+import snapshots
 import tvmaze
 
 log = logger.get_logger("episodes_by_id")
 
+# mode query parameter value answering from episodes_db only
+LITE_MODE = "lite"
+
 tvmaze_api = tvmaze.TvMazeApi()
 
 
@@ -14,26 +19,35 @@ class HttpError(object):
     pass
 
 
+@metrics.handler("episodes_by_id")
 def handle(event, context):
-    log.debug(f"Received event: {event}")
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
 
     show_id = event["pathParameters"].get("id")
     episode_id = event["pathParameters"].get("episode_id")
     query_params = event.get("queryStringParameters")
 
     try:
-        res = episodes_db.get_episode_by_id(show_id, episode_id)
+        res = episode_sync.strip_episode(episodes_db.get_episode_by_id(show_id, episode_id))
+
+        query_params = query_params or {}
+        if query_params.get("mode") == LITE_MODE:
+            # Stored fields only, without a tvmaze call
+            return responses.response(200, episode_sync.lite_episode(res))
 
-        if query_params is not None and "api_name" in query_params:
+        if "api_name" in query_params:
             if query_params["api_name"] == "tvmaze" and "tvmaze_id" in res:
-                api_res = tvmaze_api.get_episode(res["tvmaze_id"])
+                api_res, stale = snapshots.get_tvmaze_episode(tvmaze_api, res["tvmaze_id"])
                 res["is_special"] = api_res["type"] != "regular"
                 res = {**res, "tvmaze_api": {**api_res} }
+                if stale:
+                    res["tvmaze_data_stale"] = True
     except (episodes_db.NotFoundError, episodes_db.InvalidAmountOfEpisodes):
-        return {"statusCode": 404}
+        return responses.response(404)
     except tvmaze.HTTPError as e:
-        return {"statusCode": e.code}
-    return {
-        "statusCode": 200,
-        "body": json.dumps(res, cls=decimal_encoder.DecimalEncoder)
-    }
+        return responses.response(e.code)
+    except deadline.DeadlineExceeded:
+        return responses.response(504)
+    return responses.response(200, res)
@@ -2,10 +2,15 @@ import json
 import os
 from json import JSONDecodeError
 
-import decimal_encoder
+import concurrency
+import deadline
 import logger
+import metrics
+import responses
 import schema
+import show_updates
 import shows_db
+import snapshots
 import tvmaze
 
 sqs_queue = None
@@ -14,6 +19,8 @@ log = logger.get_logger("show")
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 POST_SCHEMA_PATH = os.path.join(CURRENT_DIR, "post.json")
+IO_TIMEOUT = 8
+MAX_BATCH_IDS = 200
 
 tvmaze_api = tvmaze.TvMazeApi()
 
@@ -26,41 +33,44 @@ class UnsupportedMethod(Error):
     pass
 
 
+@metrics.handler("shows")
 def handle(event, context):
-    log.debug(f"Received event: {event}")
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
 
     method = event["requestContext"]["http"]["method"]
 
-    if method == "POST":
-        body = event.get("body")
-        return _post_show(body)
-    elif method == "GET":
-        query_params = event.get("queryStringParameters")
-        return _get_show_by_api_id(query_params)
-    else:
-        raise UnsupportedMethod()
+    try:
+        if method == "POST":
+            body = event.get("body")
+            return _post_show(body)
+        elif method == "GET":
+            query_params = event.get("queryStringParameters")
+            if query_params and "ids" in query_params:
+                return _get_shows_by_ids(query_params)
+            return _get_show_by_api_id(query_params)
+        else:
+            raise UnsupportedMethod()
+    except deadline.DeadlineExceeded:
+        log.warning("Deadline exceeded for %s request", method)
+        return responses.response(504)
 
 
 def _post_show(body):
     try:
         body = json.loads(body)
     except (TypeError, JSONDecodeError):
-        log.debug(f"Invalid body: {body}")
-        return {
-            "statusCode": 400,
-            "body": "Invalid post body"
-        }
+        log.debug("Invalid body: %s", body)
+        return responses.response(400, "Invalid post body")
 
     try:
         schema.validate_schema(POST_SCHEMA_PATH, body)
     except schema.ValidationException as e:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({
-                "message": "Invalid post schema",
-                "error": str(e)
-            })
-        }
+        return responses.response(400, {
+            "message": "Invalid post schema",
+            "error": str(e)
+        })
 
     if body["api_name"] == "tvmaze":
         return _post_tvmaze(body["api_id"])
@@ -68,71 +78,93 @@ def _post_show(body):
 
 def _post_tvmaze(tvmaze_id):
     try:
-        api_res = tvmaze_api.get_show(tvmaze_id)
-        ep_count = tvmaze_api.get_show_episodes_count(tvmaze_id)
+        (api_res, ep_count), res = concurrency.run_parallel(
+            lambda: tvmaze_api.get_show_with_episodes(tvmaze_id, cached=False),
+            lambda: _get_existing_show(tvmaze_id),
+            timeout=deadline.timeout(IO_TIMEOUT),
+        )
     except tvmaze.HTTPError as e:
-        return {
-            "statusCode": e.code
-        }
+        return responses.response(e.code)
+    except concurrency.TimeoutError:
+        return responses.response(504)
 
-    try:
-        res = shows_db.get_show_by_api_id("tvmaze", int(tvmaze_id))
-    except shows_db.NotFoundError:
-        shows_db.new_show("tvmaze", int(tvmaze_id))
+    if res is None:
+        show_id = shows_db.new_show("tvmaze", int(tvmaze_id))
+        shows_db.save_snapshot(show_id, "tvmaze", api_res, ep_count, tvmaze.show_ttl(api_res))
         res = {
             "tvmaze_id": tvmaze_id,
-            "id": shows_db.create_show_uuid("tvmaze", tvmaze_id)
+            "id": show_id
         }
     else:
-        return {
-            "statusCode": 200,
-            "body": json.dumps({**res, **ep_count, "tvmaze_data": { **api_res }}, cls=decimal_encoder.DecimalEncoder),
-        }
+        shows_db.save_snapshot(res["id"], "tvmaze", api_res, ep_count, tvmaze.show_ttl(api_res))
+        res = snapshots.strip_snapshot(res)
+        return responses.response(200, {**res, **ep_count, "tvmaze_data": { **api_res }})
+
+    return responses.response(200, {**res, **ep_count, "tvmaze_data": { **api_res }})
+
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps({**res, **ep_count, "tvmaze_data": { **api_res }}, cls=decimal_encoder.DecimalEncoder),
-    }
+def _get_existing_show(tvmaze_id):
+    try:
+        return shows_db.get_show_by_api_id("tvmaze", int(tvmaze_id))
+    except shows_db.NotFoundError:
+        return None
 
 
 def _get_show_by_api_id(query_params):
     if not query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Please specify query parameters"})
-        }
+        return responses.response(400, {"error": "Please specify query parameters"})
 
     if "api_id" not in query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing api_id query parameter"})
-        }
+        return responses.response(400, {"error": "Missing api_id query parameter"})
 
     if "api_name" not in query_params:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing api_name query parameter"})
-        }
+        return responses.response(400, {"error": "Missing api_name query parameter"})
 
     api_id = int(query_params["api_id"])
     api_name = query_params["api_name"]
 
     if api_name in ["tvmaze"]:
         try:
-            res = shows_db.get_show_by_api_id(api_name, api_id)
-            api_res = tvmaze_api.get_show(api_id)
-            ep_count = tvmaze_api.get_show_episodes_count(api_id)
-            res = {**res, **ep_count, "tvmaze_data": {**api_res}}
-            return {
-                "statusCode": 200,
-                "body": json.dumps(res, cls=decimal_encoder.DecimalEncoder)
-            }
+            show = shows_db.get_show_by_api_id(api_name, api_id)
+            api_res = snapshots.get_tvmaze_show(tvmaze_api, show, api_id, revalidate=show_updates.request_refresh)
+            res = {**snapshots.strip_snapshot(show), **api_res}
+            return responses.response(200, res)
         except shows_db.NotFoundError:
-            return {"statusCode": 404}
+            return responses.response(404)
         except tvmaze.HTTPError as e:
-            return {"statusCode": e.code}
+            return responses.response(e.code)
     else:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Unsupported api_name"})
-        }
+        return responses.response(400, {"error": "Unsupported api_name"})
+
+
+def _get_shows_by_ids(query_params):
+    show_ids = [i for i in query_params["ids"].split(",") if i]
+
+    if not show_ids:
+        return responses.response(400, {"error": "Missing ids query parameter"})
+
+    if len(show_ids) > MAX_BATCH_IDS:
+        return responses.response(400, {"error": f"Too many ids, max is {MAX_BATCH_IDS}"})
+
+    api_name = query_params.get("api_name")
+    if api_name not in [None, "tvmaze"]:
+        return responses.response(400, {"error": "Unsupported api_name"})
+
+    shows = []
+    for show in shows_db.get_shows_by_ids(show_ids):
+        res = snapshots.strip_snapshot(show)
+
+        # Batch reads never go upstream, only stored snapshots are used
+        if api_name == "tvmaze":
+            # The stored JSON is passed through to the response as is
+            snapshot = shows_db.get_snapshot(show, "tvmaze", raw=True)
+            if snapshot is not None:
+                res["tvmaze_data"] = responses.RawJSON(snapshot["data"])
+
+        shows.append(res)
+
+    found = {s["id"] for s in shows}
+    return responses.response(200, {
+        "shows": shows,
+        "not_found": [i for i in dict.fromkeys(show_ids) if i not in found],
+    })
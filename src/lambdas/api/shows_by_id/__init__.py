@@ -1,8 +1,10 @@
-import json
-
 import shows_db
-import decimal_encoder
+import deadline
 import logger
+import metrics
+import responses
+import show_updates
+import snapshots
 import tvmaze
 
 log = logger.get_logger("show_by_id")
@@ -14,27 +16,31 @@ class HttpError(object):
     pass
 
 
+@metrics.handler("shows_by_id")
 def handle(event, context):
-    log.debug(f"Received event: {event}")
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
 
     show_id = event["pathParameters"].get("id")
     query_params = event.get("queryStringParameters")
 
     try:
-        res = shows_db.get_show_by_id(show_id)
+        show = shows_db.get_show_by_id(show_id)
+        res = snapshots.strip_snapshot(show)
 
         if query_params is not None and "api_name" in query_params:
             if query_params["api_name"] == "tvmaze" and "tvmaze_id" in res:
-                api_res = tvmaze_api.get_show(res["tvmaze_id"])
-                ep_count = tvmaze_api.get_show_episodes_count(res["tvmaze_id"])
-                res = {**res, **ep_count, "tvmaze_data": {**api_res}}
+                api_res = snapshots.get_tvmaze_show(
+                    tvmaze_api, show, res["tvmaze_id"], revalidate=show_updates.request_refresh
+                )
+                res = {**res, **api_res}
 
     except shows_db.NotFoundError:
-        return {"statusCode": 404}
+        return responses.response(404)
     except tvmaze.HTTPError as e:
-        return {"statusCode": e.code}
+        return responses.response(e.code)
+    except deadline.DeadlineExceeded:
+        return responses.response(504)
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps(res, cls=decimal_encoder.DecimalEncoder)
-    }
+    return responses.response(200, res)
@@ -1,20 +1,89 @@
+import os
+import time
+
+import deadline
+import logger
+import metrics
+import queues
+import show_updates
 import shows_db
-import updates
 from tvmaze import TvMazeApi
 
+QUEUE_URL = os.getenv("UPDATES_QUEUE_URL")
+CHECKPOINT_NAME = "update_eps"
+CHUNK_SIZE = 100
+WINDOWS = [
+    ("day", 24 * 60 * 60),
+    ("week", 7 * 24 * 60 * 60),
+    ("month", 30 * 24 * 60 * 60),
+]
+
+log = logger.get_logger("update_eps")
+
+tvmaze_api = TvMazeApi()
+
 
+@metrics.handler("update_eps")
 def handle(event, context):
-    tvmaze_api = TvMazeApi()
-    tvmaze_updates = tvmaze_api.get_day_updates()
+    logger.sample_debug()
+    deadline.start(context)
+    checkpoint = shows_db.get_checkpoint(CHECKPOINT_NAME)
+    since = _updates_window(checkpoint, time.time())
+    # The feed covers since up to now, the next run continues from here
+    fetched_at = int(time.time())
+    tvmaze_updates = tvmaze_api.get_updates(since)
+    tracked = shows_db.get_tracked_api_ids("tvmaze")
 
-    for tvmaze_id in tvmaze_updates:
-        try:
-            shows_db.get_show_by_api_id("tvmaze", int(tvmaze_id))
-        except shows_db.NotFoundError:
+    entries = []
+    for tvmaze_id, updated in tvmaze_updates.items():
+        show = tracked.get(int(tvmaze_id))
+        if show is None:
             # Show not present in db, exclude it from updates
             continue
 
-        # Post to SNS topic
-        updates.publish_show_update("tvmaze", tvmaze_id)
+        if updated <= show["updated"]:
+            # Already published by an earlier, overlapping run
+            continue
+
+        # Shows with the shortest data ttl (airing soon) are refreshed first,
+        # shows without a ttl yet have never been snapshotted
+        priority = show["ttl"] or 0
+        entries.append([priority, updated, int(tvmaze_id), show["id"]])
+
+    # No resume cursor, priorities change between runs. An interrupted run
+    # is picked up by the next one through the watermarks, shows published
+    # since are skipped above.
+    entries.sort()
+
+    log.info("Planning %s of %s tvmaze updates since %s", len(entries), len(tvmaze_updates), since)
+
+    queue = queues.get_queue(QUEUE_URL, show_updates.handle_records)
+    for i in range(0, len(entries), CHUNK_SIZE):
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= 0:
+            # Not completed, the next run plans the rest again
+            log.warning("Out of time after %s of %s updates, resuming on the next run", i, len(entries))
+            break
+
+        chunk = entries[i:i + CHUNK_SIZE]
+        queue.send(show_updates.chunk_message("tvmaze", [e[1:] for e in chunk]))
+    else:
+        shows_db.save_checkpoint(CHECKPOINT_NAME, {"completed_at": fetched_at})
+
+    queue.drain()
+
+
+def _updates_window(checkpoint, now):
+    if "completed_at" not in checkpoint:
+        return "day"
 
+    # Catch up on everything since the feed was last fetched by a completed
+    # run. Runs are scheduled twice a day, so a regular gap is well inside
+    # the day window and only missed runs need a wider one.
+    elapsed = now - int(checkpoint["completed_at"])
+    for since, period in WINDOWS:
+        if elapsed <= period:
+            return since
 
+    log.warning("Last completed run was %ss ago, updates older than a month are lost", elapsed)
+    return WINDOWS[-1][0]
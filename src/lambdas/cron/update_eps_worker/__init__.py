@@ -0,0 +1,15 @@
+import deadline
+import logger
+import metrics
+import show_updates
+
+log = logger.get_logger("update_eps_worker")
+
+
+@metrics.handler("update_eps_worker")
+def handle(event, context):
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
+
+    return show_updates.handle_records(event, context)
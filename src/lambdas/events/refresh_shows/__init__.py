@@ -0,0 +1,74 @@
+import json
+
+import concurrency
+import deadline
+import logger
+import metrics
+import shows_db
+import snapshots
+import ttl_cache
+import tvmaze
+
+log = logger.get_logger("refresh_shows")
+
+IO_TIMEOUT = 50
+
+# Refreshes must see the latest data, so no response cache
+tvmaze_api = tvmaze.TvMazeApi(cache=ttl_cache.TTLCache(0, 0))
+
+
+@metrics.handler("refresh_shows")
+def handle(event, context):
+    logger.sample_debug()
+    deadline.start(context)
+    log.debug("Received event: %s", event)
+
+    message_ids = {}
+    failures = []
+
+    for record in event["Records"]:
+        try:
+            key = _parse_update(record["body"])
+        except (ValueError, KeyError, TypeError):
+            log.warning("Invalid update message: %s", record['messageId'])
+            failures.append(record["messageId"])
+            continue
+
+        # The same show can be published several times within one batch
+        message_ids.setdefault(key, []).append(record["messageId"])
+
+    keys = list(message_ids)
+    results = concurrency.run_all(*[lambda k=k: _refresh(*k) for k in keys], timeout=deadline.timeout(IO_TIMEOUT))
+
+    refreshed = 0
+    for key, res in zip(keys, results):
+        if isinstance(res, Exception):
+            log.warning("Failed to refresh show %s: %s", key, res)
+            failures.extend(message_ids[key])
+        else:
+            refreshed += 1
+
+    log.info("Refreshed %s of %s shows", refreshed, len(keys))
+    return {"batchItemFailures": [{"itemIdentifier": i} for i in failures]}
+
+
+def _parse_update(body):
+    message = json.loads(body)
+    if message.get("Type") == "Notification":
+        # Not delivered with raw message delivery, unwrap the SNS envelope
+        message = json.loads(message["Message"])
+
+    return message["api_name"], str(message["api_id"])
+
+
+def _refresh(api_name, api_id):
+    if api_name != "tvmaze":
+        raise ValueError(f"Unsupported api_name: {api_name}")
+
+    try:
+        show = shows_db.get_show_by_api_id(api_name, int(api_id))
+    except shows_db.NotFoundError:
+        log.info("Show with %s_id: %s no longer tracked, skipping refresh", api_name, api_id)
+        return
+
+    snapshots.refresh_tvmaze_show(tvmaze_api, show["id"], api_id, sync_episodes=True)
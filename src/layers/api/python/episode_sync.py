@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+import episodes_db
+import logger
+import tvmaze
+
+log = logger.get_logger(__name__)
+
+# Stored for sync bookkeeping only, never returned
+INTERNAL_ATTRIBUTES = {"content_hash"}
+# All a lite response returns
+LITE_ATTRIBUTES = ["id", "show_id", "tvmaze_id", "is_special"] + tvmaze.EPISODE_FIELDS
+
+
+def content_hash(episode):
+    # Only what is stored on the item, changes to anything else (ratings,
+    # links) don't need a write
+    stored = {"id": episode["id"], **tvmaze.episode_fields(episode)}
+    data = json.dumps(stored, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+def strip_episode(episode):
+    return {k: v for k, v in episode.items() if k not in INTERNAL_ATTRIBUTES}
+
+
+def lite_episode(episode):
+    return {k: episode[k] for k in LITE_ATTRIBUTES if k in episode}
+
+
+def sync_episodes(show_id, api_name, episodes):
+    stored = episodes_db.get_content_hashes(show_id, api_name)
+
+    items = []
+    for e in episodes:
+        h = content_hash(e)
+        if stored.get(e["id"]) == h:
+            continue
+
+        items.append({
+            **tvmaze.episode_fields(e),
+            "show_id": show_id,
+            "id": episodes_db.create_episode_uuid(show_id, str(e["id"])),
+            f"{api_name}_id": e["id"],
+            "content_hash": h,
+        })
+
+    if items:
+        episodes_db.put_episodes(items)
+
+    log.info("Synced %s of %s %s episodes for show: %s", len(items), len(episodes), api_name, show_id)
+    return len(items)
@@ -0,0 +1,111 @@
+import os
+import time
+
+import episode_sync
+import logger
+import shows_db
+import tvmaze
+
+# Snapshots older than their soft ttl, picked per show by tvmaze.show_ttl,
+# are served while a refresh is requested. Past the hard ttl reads wait for
+# the refresh.
+HARD_TTL = int(os.getenv("SNAPSHOT_HARD_TTL", str(7 * 24 * 60 * 60)))
+
+log = logger.get_logger(__name__)
+
+
+def strip_snapshot(show, api_name="tvmaze"):
+    internal = {
+        f"{api_name}_snapshot",
+        f"{api_name}_snapshot_version",
+        f"{api_name}_fetched_at",
+        f"{api_name}_stale",
+        f"{api_name}_refresh_requested_at",
+        f"{api_name}_ttl",
+        f"{api_name}_updated",
+    }
+    return {k: v for k, v in show.items() if k not in internal}
+
+
+def soft_ttl(snapshot):
+    return tvmaze.show_ttl(snapshot["data"])
+
+
+def hard_ttl(snapshot):
+    return max(HARD_TTL, 2 * soft_ttl(snapshot))
+
+
+def is_fresh(snapshot):
+    if snapshot is None or snapshot["stale"]:
+        return False
+    return time.time() - snapshot["fetched_at"] < soft_ttl(snapshot)
+
+
+def is_usable(snapshot):
+    if snapshot is None:
+        return False
+    return time.time() - snapshot["fetched_at"] < hard_ttl(snapshot)
+
+
+def get_tvmaze_show(tvmaze_api, show, tvmaze_id, revalidate=None):
+    snapshot = shows_db.get_snapshot(show, "tvmaze")
+    ep_count = shows_db.get_ep_count(show)
+
+    if ep_count is not None and revalidate is not None and not is_fresh(snapshot) and is_usable(snapshot):
+        _revalidate(revalidate, show["id"], tvmaze_id)
+        return {**ep_count, "tvmaze_data": snapshot["data"]}
+
+    try:
+        if ep_count is None or (snapshot is not None and snapshot["stale"]):
+            # Episode counts only change when the updates feed flags the show
+            log.debug("Refreshing tvmaze snapshot and episode count for show: %s", show['id'])
+            return refresh_tvmaze_show(tvmaze_api, show["id"], tvmaze_id)
+
+        if is_fresh(snapshot):
+            data = snapshot["data"]
+        else:
+            log.debug("Refreshing tvmaze snapshot for show: %s", show['id'])
+            data = tvmaze_api.get_show(tvmaze_id, cached=False)
+            shows_db.save_snapshot(show["id"], "tvmaze", data, ttl=tvmaze.show_ttl(data))
+    except tvmaze.HTTPError as e:
+        # TVmaze is failing or we ran out of time, the last known data beats
+        # an error as long as it is marked stale
+        data = snapshot["data"] if snapshot is not None else e.stale_data
+        if e.code == 404 or ep_count is None or data is None:
+            raise
+        log.warning("TVmaze failed with %s for show: %s, serving stale data", e.code, show['id'])
+        return {**ep_count, "tvmaze_data": data, "tvmaze_data_stale": True}
+
+    return {**ep_count, "tvmaze_data": data}
+
+
+def _revalidate(revalidate, show_id, tvmaze_id):
+    # A failed refresh request must not fail the read, the next read past the
+    # soft ttl tries again
+    try:
+        revalidate("tvmaze", tvmaze_id, show_id)
+    except Exception:
+        log.exception("Failed to request refresh for show: %s", show_id)
+
+
+def get_tvmaze_episode(tvmaze_api, tvmaze_id):
+    # Episodes have no stored snapshot, only the api cache can stand in
+    try:
+        return tvmaze_api.get_episode(tvmaze_id), False
+    except tvmaze.HTTPError as e:
+        if e.stale_data is None:
+            raise
+        log.warning("TVmaze failed with %s for episode: %s, serving stale data", e.code, tvmaze_id)
+        return e.stale_data, True
+
+
+def refresh_tvmaze_show(tvmaze_api, show_id, tvmaze_id, sync_episodes=False):
+    if not sync_episodes:
+        data, ep_count = tvmaze_api.get_show_with_episodes(tvmaze_id, cached=False)
+    else:
+        data, episodes = tvmaze_api.get_show_and_episodes(tvmaze_id, cached=False)
+        ep_count = tvmaze.count_episodes(episodes)
+        episode_sync.sync_episodes(show_id, "tvmaze", episodes)
+
+    shows_db.save_snapshot(show_id, "tvmaze", data, ep_count, tvmaze.show_ttl(data))
+    return {**ep_count, "tvmaze_data": data}
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, max_entries, max_bytes, clock=time.monotonic, stale_ttl=0):
+        self.max_entries = max_entries
+        # Expired entries are kept this long for get_stale
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            value, expires, size = entry
+            now = self.clock()
+            if expires <= now:
+                if expires + self.stale_ttl <= now:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def get_stale(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+
+            value, expires, _ = entry
+            if expires + self.stale_ttl <= self.clock():
+                self._remove(key)
+                return False, None
+
+            return True, value
+
+    def set(self, key, value, ttl, size=0):
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (value, self.clock() + ttl, size)
+            self.size += size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+        }
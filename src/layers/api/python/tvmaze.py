@@ -1,9 +1,58 @@
+import os
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 
+import deadline
 import logger
+import metrics
+import ttl_cache
 
 log = logger.get_logger(__name__)
 
+REQUEST_TIMEOUT = float(os.getenv("TVMAZE_REQUEST_TIMEOUT", "2.5"))
+RATE_LIMIT_CALLS = int(os.getenv("TVMAZE_RATE_LIMIT_CALLS", "20"))
+RATE_LIMIT_PERIOD = float(os.getenv("TVMAZE_RATE_LIMIT_PERIOD", "10"))
+MAX_RETRIES = int(os.getenv("TVMAZE_MAX_RETRIES", "2"))
+MAX_RETRY_AFTER = 5.0
+POOL_SIZE = 10
+
+CACHE_MAX_ENTRIES = int(os.getenv("TVMAZE_CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("TVMAZE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTLS = {
+    "show": 15 * 60,
+    "show_with_episodes": 15 * 60,
+    "show_episodes": 15 * 60,
+    "episode": 60 * 60,
+    "updates": 60,
+}
+NOT_FOUND_TTL = 5 * 60
+# Cached in place of 404 responses, every hit raises a new HTTPError
+NOT_FOUND = object()
+# Expired responses are kept this long to fall back on when TVmaze fails
+STALE_TTL = int(os.getenv("TVMAZE_STALE_TTL", str(24 * 60 * 60)))
+
+DAY = 24 * 60 * 60
+# Show data ttls, shows that are not running barely change while running
+# shows change around their airings
+STATUS_TTLS = {
+    "Ended": 7 * DAY,
+    "To Be Determined": DAY,
+    "In Development": DAY,
+}
+AIRING_TTL = 15 * 60
+RUNNING_TTL = 12 * 60 * 60
+DORMANT_TTL = 2 * DAY
+DORMANT_AFTER = 60 * DAY
+EPISODE_FIELDS = ["season", "number", "airdate", "runtime"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+BREAKER_FAILURES = int(os.getenv("TVMAZE_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("TVMAZE_BREAKER_COOLDOWN", "30"))
+SLOW_CALL_THRESHOLD = float(os.getenv("TVMAZE_SLOW_CALL_THRESHOLD", "2"))
+
 
 class Error(Exception):
     pass
@@ -14,56 +63,287 @@ class HTTPError(Error):
     def __init__(self, code):
         Error.__init__(self, f"Unexpected status code: {code}")
         self.code = code
-    
+        # Last known response for the request, if still cached
+        self.stale_data = None
+
+
+class CircuitOpenError(HTTPError):
 
-class TvMazeApi:
     def __init__(self):
+        HTTPError.__init__(self, 503)
+
+
+class TokenBucket:
+    def __init__(self, capacity, period, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=None):
+        # False, without waiting, when no token frees up within timeout
+        expires_at = None if timeout is None else self.clock() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if expires_at is not None and self.clock() + wait > expires_at:
+                return False
+            self.sleep(wait)
+
+    def drain(self):
+        # Upstream told us we are over the limit, stop handing out tokens until
+        # the bucket has refilled
+        with self.lock:
+            self._refill()
+            self.tokens = 0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, cooldown, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        # Like allow, without claiming the half open trial
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            return self.trial or self.clock() - self.opened_at < self.cooldown
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            # Half open after the cool-down, a single trial call decides
+            # whether to close again
+            if not self.trial and self.clock() - self.opened_at >= self.cooldown:
+                self.trial = True
+                return True
+
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.trial or self.failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        log.warning("TVmaze circuit opened after %s failures", self.failures)
+                    self.opened_at = self.clock()
+            self.trial = False
+
+
+def _create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+
+class TvMazeApi:
+    def __init__(self, session=None, bucket=None, cache=None, breaker=None, sleep=time.sleep):
         self.base_url = "https://api.tvmaze.com"
+        self.session = session if session is not None else _create_session()
+        self.bucket = bucket if bucket is not None else TokenBucket(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD)
+        self.cache = cache if cache is not None else ttl_cache.TTLCache(
+            CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, stale_ttl=STALE_TTL
+        )
+        self.breaker = breaker if breaker is not None else CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self.sleep = sleep
 
-        log.debug("TvMazeApi base_url: {}".format(self.base_url))
+        log.debug("TvMazeApi base_url: %s", self.base_url)
 
-    def get_show(self, show_id):
-        res = requests.get(f"{self.base_url}/shows/{show_id}")
+    def _get(self, endpoint, path, params=None, cached=True):
+        # Data that gets persisted is fetched with cached=False, a cached
+        # response can be days old. The response still refreshes the cache.
+        key = (path, tuple(sorted((params or {}).items())))
+        with metrics.timer(f"tvmaze.{endpoint}") as span:
+            hit, value = self.cache.get(key) if cached else (False, None)
+            span.dimensions["cache"] = ("hit" if hit else "miss") if cached else "bypass"
+            if hit:
+                if value is NOT_FOUND:
+                    raise HTTPError(404)
+                return value
 
-        if res.status_code != 200:
-            raise HTTPError(res.status_code)
-        return res.json()
+            try:
+                value = self._fetch(path, params)
+            except HTTPError as e:
+                if e.code == 404:
+                    self.cache.set(key, NOT_FOUND, NOT_FOUND_TTL)
+                else:
+                    found, stale = self.cache.get_stale(key)
+                    if found and stale is not NOT_FOUND:
+                        e.stale_data = stale
+                raise
 
-    def get_episode(self, episode_id):
-        res = requests.get(f"{self.base_url}/episodes/{episode_id}")
+        data, size = value
+        ttl = CACHE_TTLS[endpoint]
+        if endpoint in ("show", "show_with_episodes"):
+            ttl = show_ttl(data)
+        self.cache.set(key, data, ttl, size)
+        return data
+
+    def _fetch(self, path, params):
+        attempt = 0
+        while True:
+            # Fail fast, an open circuit or a spent deadline must not wait for
+            # or use up a token
+            if self.breaker.is_open():
+                metrics.count("tvmaze.circuit_open")
+                raise CircuitOpenError()
+
+            remaining = deadline.remaining()
+            if (remaining is not None and remaining <= 0) or not self.bucket.acquire(remaining):
+                log.warning("No time left for TVmaze request for %s", path)
+                raise HTTPError(504)
+
+            try:
+                timeout = deadline.timeout(REQUEST_TIMEOUT)
+            except deadline.DeadlineExceeded:
+                log.warning("No time left for TVmaze request for %s", path)
+                raise HTTPError(504)
+
+            if not self.breaker.allow():
+                metrics.count("tvmaze.circuit_open")
+                raise CircuitOpenError()
+
+            start = time.monotonic()
+            try:
+                res = self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout)
+            except requests.Timeout:
+                self.breaker.record(False)
+                log.warning("TVmaze request for %s timed out", path)
+                raise HTTPError(504)
+            except requests.RequestException as e:
+                self.breaker.record(False)
+                log.warning("TVmaze request for %s failed: %s", path, e)
+                raise HTTPError(502)
+
+            # Slow answers count as failures too, client errors other than
+            # rate limiting mean TVmaze is healthy
+            elapsed = time.monotonic() - start
+            self.breaker.record(res.status_code < 500 and res.status_code != 429 and elapsed < SLOW_CALL_THRESHOLD)
+
+            if res.status_code != 429 or attempt >= MAX_RETRIES:
+                break
+
+            attempt += 1
+            self.bucket.drain()
+            wait = _retry_after(res, attempt)
+            remaining = deadline.remaining()
+            if remaining is not None and wait >= remaining:
+                break
+            log.warning("TVmaze rate limit hit for %s, retrying in %ss", path, wait)
+            self.sleep(wait)
 
         if res.status_code != 200:
             raise HTTPError(res.status_code)
-        return res.json()
+        return res.json(), len(res.content)
+
+    def get_show(self, show_id, cached=True):
+        return self._get("show", f"/shows/{show_id}", cached=cached)
+
+    def get_episode(self, episode_id):
+        return self._get("episode", f"/episodes/{episode_id}")
 
     def get_day_updates(self):
-        res = requests.get(f"{self.base_url}/updates/shows?since=day")
-        if res.status_code != 200:
-            raise HTTPError(res.status_code)
-        return res.json()
+        return self.get_updates("day")
+
+    def get_updates(self, since):
+        return self._get("updates", "/updates/shows", params={"since": since})
+
+    def get_show_episodes(self, show_id, cached=True):
+        return self._get("show_episodes", f"/shows/{show_id}/episodes", params={"specials": 1}, cached=cached)
 
-    def get_show_episodes(self, show_id):
-        res = requests.get(
-            f"{self.base_url}/shows/{show_id}/episodes?specials=1"
+    def get_show_and_episodes(self, show_id, cached=True):
+        show = self._get(
+            "show_with_episodes",
+            f"/shows/{show_id}",
+            params={"embed": "episodes", "specials": 1},
+            cached=cached,
         )
+        episodes = show.get("_embedded", {}).get("episodes", [])
+        show = {k: v for k, v in show.items() if k != "_embedded"}
 
-        if res.status_code != 200:
-            raise HTTPError(res.status_code)
-        return res.json()
+        return show, episodes
+
+    def get_show_with_episodes(self, show_id, cached=True):
+        show, episodes = self.get_show_and_episodes(show_id, cached)
+        return show, count_episodes(episodes)
 
     def get_show_episodes_count(self, show_id):
-        episodes = self.get_show_episodes(show_id)
+        return count_episodes(self.get_show_episodes(show_id))
 
-        ep_count = 0
-        special_count = 0
 
-        for e in episodes:
-            if e["type"] == "regular":
-                ep_count += 1
-            else:
-                special_count += 1
+def show_ttl(show, now=None):
+    now = time.time() if now is None else now
+
+    status = show.get("status")
+    if status in STATUS_TTLS:
+        return STATUS_TTLS[status]
+
+    # Schedule days are in the network's local time, also checking yesterday
+    # covers evening airings that are on the next day in UTC
+    days = set((show.get("schedule") or {}).get("days") or [])
+    today = time.gmtime(now).tm_wday
+    if days & {WEEKDAYS[today], WEEKDAYS[today - 1]}:
+        return AIRING_TTL
+
+    updated = show.get("updated")
+    if updated and now - updated > DORMANT_AFTER:
+        return DORMANT_TTL
+
+    return RUNNING_TTL
+
+
+def count_episodes(episodes):
+    ep_count = 0
+    special_count = 0
+
+    for e in episodes:
+        if e["type"] == "regular":
+            ep_count += 1
+        else:
+            special_count += 1
+
+    return {
+        "ep_count": ep_count,
+        "special_count": special_count,
+    }
+
+
+def episode_fields(episode):
+    # The episode fields stored on our items, so reads don't need tvmaze
+    fields = {k: episode.get(k) for k in EPISODE_FIELDS}
+    if "type" in episode:
+        fields["is_special"] = episode["type"] != "regular"
+    return {k: v for k, v in fields.items() if v is not None}
+
 
-        return {
-            "ep_count": ep_count,
-            "special_count": special_count,
-        }
+def _retry_after(res, attempt):
+    try:
+        wait = float(res.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        wait = float(2 ** (attempt - 1))
+    return min(max(wait, 0), MAX_RETRY_AFTER)
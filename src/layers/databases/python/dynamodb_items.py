@@ -0,0 +1,75 @@
+def _number(n):
+    if "." in n or "e" in n or "E" in n:
+        return float(n)
+    return int(n)
+
+
+def _value(v):
+    if "S" in v:
+        return v["S"]
+    if "N" in v:
+        return _number(v["N"])
+    if "BOOL" in v:
+        return v["BOOL"]
+    if "M" in v:
+        return {k: _value(i) for k, i in v["M"].items()}
+    if "L" in v:
+        return [_value(i) for i in v["L"]]
+    if "NULL" in v:
+        return None
+    if "SS" in v:
+        return list(v["SS"])
+    if "NS" in v:
+        return [_number(i) for i in v["NS"]]
+    if "B" in v:
+        return v["B"]
+    if "BS" in v:
+        return list(v["BS"])
+    raise ValueError(f"Unsupported DynamoDB value: {v}")
+
+
+def _str(s):
+    return s
+
+
+# Attribute name -> (DynamoDB type, converter) for the attributes we store.
+# Anything not listed, or stored with another type, goes through _value.
+SHOW_ATTRIBUTES = {
+    "id": ("S", _str),
+    "tvmaze_id": ("N", int),
+    "ep_count": ("N", int),
+    "special_count": ("N", int),
+    "broadcast_day": ("S", _str),
+    "tvmaze_snapshot": ("S", _str),
+    "tvmaze_snapshot_version": ("N", int),
+    "tvmaze_fetched_at": ("N", int),
+    "tvmaze_stale": ("BOOL", bool),
+    "tvmaze_updated": ("N", int),
+    "tvmaze_refresh_requested_at": ("N", int),
+    "tvmaze_ttl": ("N", int),
+}
+
+EPISODE_ATTRIBUTES = {
+    "id": ("S", _str),
+    "show_id": ("S", _str),
+    "tvmaze_id": ("N", int),
+    "content_hash": ("S", _str),
+    "is_special": ("BOOL", bool),
+    "season": ("N", int),
+    "number": ("N", int),
+    "airdate": ("S", _str),
+    "runtime": ("N", int),
+}
+
+
+def loads(item, attributes=None):
+    attributes = attributes or {}
+
+    res = {}
+    for name, v in item.items():
+        known = attributes.get(name)
+        if known is not None and known[0] in v:
+            res[name] = known[1](v[known[0]])
+        else:
+            res[name] = _value(v)
+    return res
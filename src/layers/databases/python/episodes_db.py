@@ -1,13 +1,33 @@
+import base64
+import binascii
+import json
 import os
+import time
 import uuid
 
 import boto3
 from boto3.dynamodb.conditions import Key
-from dynamodb_json import json_util
+from botocore.config import Config
+from boto3.dynamodb.types import TypeSerializer
 
+import concurrency
+import deadline
+import dynamodb_items
 import logger
+import metrics
 
 DATABASE_NAME = os.getenv("SHOW_EPISODES_DATABASE_NAME")
+BATCH_WRITE_LIMIT = 25
+BATCH_MAX_RETRIES = 5
+# Read through the low level client, skipping the Decimal round trip of the
+# Table resource
+RAW_READS = os.getenv("DYNAMODB_RAW_READS", "false") == "true"
+# Keep a single slow call from using up the whole lambda timeout
+CLIENT_CONFIG = Config(
+    connect_timeout=1,
+    read_timeout=float(os.getenv("DYNAMODB_READ_TIMEOUT", "2")),
+    retries={"max_attempts": 3},
+)
 
 table = None
 client = None
@@ -27,17 +47,34 @@ class InvalidAmountOfEpisodes(Error):
     pass
 
 
+class InvalidCursorError(Error):
+    pass
+
+
 def _get_table():
     global table
     if table is None:
-        table = boto3.resource("dynamodb").Table(DATABASE_NAME)
+        with concurrency.boto3_lock:
+            if table is None:
+                table = boto3.resource("dynamodb", config=CLIENT_CONFIG).Table(DATABASE_NAME)
+                deadline.bind_client(table.meta.client)
     return table
 
 
-def new_episode(show_id, api_name, api_id):
+def _get_client():
+    global client
+    if client is None:
+        with concurrency.boto3_lock:
+            if client is None:
+                client = deadline.bind_client(boto3.client("dynamodb", config=CLIENT_CONFIG))
+    return client
+
+
+def new_episode(show_id, api_name, api_id, fields=None):
     episode_id = create_episode_uuid(show_id, str(api_id))
 
     data = {
+        **(fields or {}),
         f"{api_name}_id": api_id
     }
     update_episode(show_id, episode_id, data)
@@ -45,10 +82,45 @@ def new_episode(show_id, api_name, api_id):
     return episode_id
 
 
+@metrics.timer("episodes_db.put_episodes")
+def put_episodes(items):
+    serializer = TypeSerializer()
+
+    for i in range(0, len(items), BATCH_WRITE_LIMIT):
+        requests = []
+        for item in items[i:i + BATCH_WRITE_LIMIT]:
+            requests.append({
+                "PutRequest": {
+                    "Item": {k: serializer.serialize(v) for k, v in item.items()}
+                }
+            })
+        _batch_write(requests)
+
+
+def _batch_write(requests):
+    request = {DATABASE_NAME: requests}
+    attempt = 0
+
+    while True:
+        res = _get_client().batch_write_item(RequestItems=request)
+
+        request = res.get("UnprocessedItems")
+        if not request:
+            break
+
+        attempt += 1
+        if attempt > BATCH_MAX_RETRIES:
+            raise Error(f"Unprocessed items left after {BATCH_MAX_RETRIES} retries")
+
+        log.debug("Retrying %s unprocessed items", len(request[DATABASE_NAME]))
+        time.sleep(min(0.05 * 2 ** attempt, 1))
+
+
 def create_episode_uuid(show_id, api_id):
     return str(uuid.uuid5(uuid.UUID(show_id), str(api_id)))
 
 
+@metrics.timer("episodes_db.update_episode")
 def update_episode(show_id, episode_id, data):
     items = ','.join(f'#{k}=:{k}' for k in data)
     update_expression = f"SET {items}"
@@ -56,9 +128,9 @@ def update_episode(show_id, episode_id, data):
     expression_attribute_values = {f':{k}': v for k, v in data.items()}
 
     log.debug("Running update_item")
-    log.debug(f"Update expression: {update_expression}")
-    log.debug(f"Expression attribute names: {expression_attribute_names}")
-    log.debug(f"Expression attribute values: {expression_attribute_values}")
+    log.debug("Update expression: %s", update_expression)
+    log.debug("Expression attribute names: %s", expression_attribute_names)
+    log.debug("Expression attribute values: %s", expression_attribute_values)
 
     _get_table().update_item(
         Key={"show_id": show_id, "id": episode_id},
@@ -68,10 +140,20 @@ def update_episode(show_id, episode_id, data):
     )
 
 
+@metrics.timer("episodes_db.get_episode_by_id")
 def get_episode_by_id(show_id, episode_id):
-    res = _get_table().query(
-        KeyConditionExpression=Key("id").eq(episode_id) & Key("show_id").eq(show_id)
-    )
+    if RAW_READS:
+        res = _get_client().query(
+            TableName=DATABASE_NAME,
+            KeyConditionExpression="#id = :id AND #show_id = :show_id",
+            ExpressionAttributeNames={"#id": "id", "#show_id": "show_id"},
+            ExpressionAttributeValues={":id": {"S": episode_id}, ":show_id": {"S": show_id}},
+        )
+        res["Items"] = [dynamodb_items.loads(i, dynamodb_items.EPISODE_ATTRIBUTES) for i in res.get("Items", [])]
+    else:
+        res = _get_table().query(
+            KeyConditionExpression=Key("id").eq(episode_id) & Key("show_id").eq(show_id)
+        )
 
     if "Items" not in res or not res["Items"]:
         raise NotFoundError(f"Episode with id: {episode_id} not found for show with id: {show_id}")
@@ -82,13 +164,14 @@ def get_episode_by_id(show_id, episode_id):
     return res["Items"][0]
 
 
+@metrics.timer("episodes_db.get_episode_by_api_id")
 def get_episode_by_api_id(api_name, api_id):
     key_name = f"{api_name}_id"
     res = _get_table().query(
         IndexName=key_name,
         KeyConditionExpression=Key(key_name).eq(api_id)
     )
-    log.debug(f"get_episode_by_api_id res: {res}")
+    log.debug("get_episode_by_api_id res: %s", res)
 
     if not res["Items"]:
         raise NotFoundError(f"Episode with {key_name}: {api_id} not found")
@@ -97,3 +180,67 @@ def get_episode_by_api_id(api_name, api_id):
         raise InvalidAmountOfEpisodes(f"Episode with {key_name}: {api_id} has {res['Count']} results")
 
     return res["Items"][0]
+
+
+def episodes_generator(show_id, limit=100, start_key=None, attributes=None):
+    while True:
+        kwargs = {}
+        if start_key is not None:
+            kwargs["ExclusiveStartKey"] = start_key
+        if attributes is not None:
+            kwargs["ProjectionExpression"] = ", ".join(f"#{a}" for a in attributes)
+            kwargs["ExpressionAttributeNames"] = {f"#{a}": a for a in attributes}
+
+        res = _get_table().query(
+            KeyConditionExpression=Key("show_id").eq(show_id),
+            Limit=limit,
+            **kwargs
+        )
+        start_key = res.get("LastEvaluatedKey")
+
+        yield res["Items"], start_key
+
+        if start_key is None:
+            break
+
+
+@metrics.timer("episodes_db.get_content_hashes")
+def get_content_hashes(show_id, api_name):
+    key_name = f"{api_name}_id"
+    hashes = {}
+
+    for items, _ in episodes_generator(show_id, limit=1000, attributes=[key_name, "content_hash"]):
+        for i in items:
+            if key_name in i:
+                hashes[int(i[key_name])] = i.get("content_hash")
+
+    return hashes
+
+
+@metrics.timer("episodes_db.get_episodes_page")
+def get_episodes_page(show_id, limit=100, cursor=None):
+    start_key = None
+    if cursor is not None:
+        start_key = decode_cursor(cursor)
+        if start_key.get("show_id") != show_id:
+            raise InvalidCursorError(f"Cursor doesn't belong to show with id: {show_id}")
+
+    items, last_key = next(episodes_generator(show_id, limit, start_key))
+    return items, encode_cursor(last_key)
+
+
+def encode_cursor(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+    if not isinstance(key, dict) or set(key) != {"show_id", "id"}:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+    return key
@@ -1,14 +1,35 @@
+import json
 import os
+import time
 import uuid
 
 import boto3
 from boto3.dynamodb.conditions import Key
-from dynamodb_json import json_util
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
+import concurrency
+import deadline
+import dynamodb_items
 import logger
+import metrics
 
 DATABASE_NAME = os.getenv("SHOWS_DATABASE_NAME")
 SHOW_UUID_NAMESPACE = uuid.UUID("6045673a-9dd2-451c-aa58-d94a217b993a")
+SNAPSHOT_VERSION = 1
+BATCH_GET_LIMIT = 100
+BATCH_MAX_RETRIES = 5
+# Job checkpoints share the shows table, show reads never return them
+CHECKPOINT_PREFIX = "checkpoint#"
+# Read through the low level client, skipping the Decimal round trip of the
+# Table resource
+RAW_READS = os.getenv("DYNAMODB_RAW_READS", "false") == "true"
+# Keep a single slow call from using up the whole lambda timeout
+CLIENT_CONFIG = Config(
+    connect_timeout=1,
+    read_timeout=float(os.getenv("DYNAMODB_READ_TIMEOUT", "2")),
+    retries={"max_attempts": 3},
+)
 
 table = None
 client = None
@@ -27,14 +48,19 @@ class NotFoundError(Error):
 def _get_table():
     global table
     if table is None:
-        table = boto3.resource("dynamodb").Table(DATABASE_NAME)
+        with concurrency.boto3_lock:
+            if table is None:
+                table = boto3.resource("dynamodb", config=CLIENT_CONFIG).Table(DATABASE_NAME)
+                deadline.bind_client(table.meta.client)
     return table
 
 
 def _get_client():
     global client
     if client is None:
-        client = boto3.client("dynamodb")
+        with concurrency.boto3_lock:
+            if client is None:
+                client = deadline.bind_client(boto3.client("dynamodb", config=CLIENT_CONFIG))
     return client
 
 
@@ -51,41 +77,196 @@ def create_show_uuid(api_name, api_id):
     return item_uuid
 
 
-def update_show(show_id, data):
+@metrics.timer("shows_db.update_show")
+def update_show(show_id, data, condition_expression=None):
     items = ','.join(f'#{k}=:{k}' for k in data)
     update_expression = f"SET {items}"
     expression_attribute_names = {f'#{k}': k for k in data}
     expression_attribute_values = {f':{k}': v for k, v in data.items()}
 
     log.debug("Running update_item")
-    log.debug(f"Update expression: {update_expression}")
-    log.debug(f"Expression attribute names: {expression_attribute_names}")
-    log.debug(f"Expression attribute values: {expression_attribute_values}")
+    log.debug("Update expression: %s", update_expression)
+    log.debug("Expression attribute names: %s", expression_attribute_names)
+    log.debug("Expression attribute values: %s", expression_attribute_values)
+
+    kwargs = {}
+    if condition_expression is not None:
+        kwargs["ConditionExpression"] = condition_expression
 
     _get_table().update_item(
         Key={"id": show_id},
         UpdateExpression=update_expression,
         ExpressionAttributeNames=expression_attribute_names,
-        ExpressionAttributeValues=expression_attribute_values
+        ExpressionAttributeValues=expression_attribute_values,
+        **kwargs
     )
 
 
+def save_snapshot(show_id, api_name, data, ep_count=None, ttl=None):
+    fetched_at = int(time.time())
+    item = {
+        f"{api_name}_snapshot": json.dumps(data),
+        f"{api_name}_snapshot_version": SNAPSHOT_VERSION,
+        f"{api_name}_fetched_at": fetched_at,
+        f"{api_name}_stale": False,
+    }
+    if ep_count is not None:
+        item.update(ep_count)
+    if ttl is not None:
+        # Lets the update planner prioritise without loading the snapshot
+        item[f"{api_name}_ttl"] = ttl
+
+    update_show(show_id, item)
+    return fetched_at
+
+
+def get_ep_count(show):
+    if "ep_count" not in show or "special_count" not in show:
+        return None
+
+    return {
+        "ep_count": int(show["ep_count"]),
+        "special_count": int(show["special_count"]),
+    }
+
+
+def get_snapshot(show, api_name, raw=False):
+    snapshot = show.get(f"{api_name}_snapshot")
+    if snapshot is None or show.get(f"{api_name}_snapshot_version") != SNAPSHOT_VERSION:
+        return None
+
+    return {
+        "data": snapshot if raw else json.loads(snapshot),
+        "fetched_at": int(show.get(f"{api_name}_fetched_at", 0)),
+        "stale": bool(show.get(f"{api_name}_stale", False)),
+    }
+
+
+def mark_snapshot_stale(show_id, api_name, updated=None):
+    kwargs = {
+        "UpdateExpression": "SET #stale = :stale",
+        "ExpressionAttributeNames": {"#stale": f"{api_name}_stale"},
+        "ExpressionAttributeValues": {":stale": True},
+    }
+
+    if updated is not None:
+        # Only shows not published for updated yet, the watermark is moved by
+        # save_updated once the update is published
+        kwargs["ConditionExpression"] = "attribute_not_exists(#updated) OR #updated < :updated"
+        kwargs["ExpressionAttributeNames"]["#updated"] = f"{api_name}_updated"
+        kwargs["ExpressionAttributeValues"][":updated"] = updated
+
+    try:
+        _get_table().update_item(Key={"id": show_id}, **kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def save_updated(show_id, api_name, updated):
+    key = f"{api_name}_updated"
+
+    # Only move the watermark forward, older updates were already handled
+    try:
+        update_show(show_id, {key: updated}, f"attribute_not_exists(#{key}) OR #{key} < :{key}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def claim_refresh(show_id, api_name, min_interval):
+    key = f"{api_name}_refresh_requested_at"
+    now = int(time.time())
+
+    # Only one caller per min_interval gets to request a refresh
+    try:
+        _get_table().update_item(
+            Key={"id": show_id},
+            UpdateExpression="SET #requested = :now",
+            ConditionExpression="attribute_not_exists(#requested) OR #requested < :cutoff",
+            ExpressionAttributeNames={"#requested": key},
+            ExpressionAttributeValues={":now": now, ":cutoff": now - min_interval},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def get_checkpoint(name):
+    res = _get_table().get_item(Key={"id": f"{CHECKPOINT_PREFIX}{name}"})
+    return res.get("Item", {})
+
+
+def save_checkpoint(name, data):
+    update_show(f"{CHECKPOINT_PREFIX}{name}", data)
+
+
+@metrics.timer("shows_db.get_show_by_id")
 def get_show_by_id(show_id):
-    res = _get_table().get_item(Key={"id": show_id})
+    if show_id and show_id.startswith(CHECKPOINT_PREFIX):
+        raise NotFoundError(f"Show with id: {show_id} not found")
+
+    if RAW_READS:
+        res = _get_client().get_item(TableName=DATABASE_NAME, Key={"id": {"S": show_id}})
+    else:
+        res = _get_table().get_item(Key={"id": show_id})
 
     if "Item" not in res:
         raise NotFoundError(f"Show with id: {show_id} not found")
 
+    if RAW_READS:
+        return dynamodb_items.loads(res["Item"], dynamodb_items.SHOW_ATTRIBUTES)
     return res["Item"]
 
 
+@metrics.timer("shows_db.get_shows_by_ids")
+def get_shows_by_ids(show_ids):
+    show_ids = [i for i in dict.fromkeys(show_ids) if not i.startswith(CHECKPOINT_PREFIX)]
+    items = {}
+
+    for i in range(0, len(show_ids), BATCH_GET_LIMIT):
+        keys = [{"id": {"S": show_id}} for show_id in show_ids[i:i + BATCH_GET_LIMIT]]
+        for item in _batch_get(keys):
+            item = dynamodb_items.loads(item, dynamodb_items.SHOW_ATTRIBUTES)
+            items[item["id"]] = item
+
+    return [items[show_id] for show_id in show_ids if show_id in items]
+
+
+def _batch_get(keys):
+    request = {DATABASE_NAME: {"Keys": keys}}
+    attempt = 0
+
+    while request:
+        res = _get_client().batch_get_item(RequestItems=request)
+        yield from res["Responses"].get(DATABASE_NAME, [])
+
+        request = res.get("UnprocessedKeys")
+        if not request:
+            break
+
+        attempt += 1
+        if attempt > BATCH_MAX_RETRIES:
+            raise Error(f"Unprocessed keys left after {BATCH_MAX_RETRIES} retries")
+
+        log.debug("Retrying %s unprocessed keys", len(request[DATABASE_NAME]['Keys']))
+        time.sleep(min(0.05 * 2 ** attempt, 1))
+
+
+@metrics.timer("shows_db.get_show_by_api_id")
 def get_show_by_api_id(api_name, api_id):
     key_name = f"{api_name}_id"
     res = _get_table().query(
         IndexName=key_name,
         KeyConditionExpression=Key(key_name).eq(api_id)
     )
-    log.debug(f"get_show_by_api_id res: {res}")
+    log.debug("get_show_by_api_id res: %s", res)
 
     if not res["Items"]:
         raise NotFoundError(f"Show with {key_name}: {api_id} not found")
@@ -93,6 +274,38 @@ def get_show_by_api_id(api_name, api_id):
     return res["Items"][0]
 
 
+@metrics.timer("shows_db.get_tracked_api_ids")
+def get_tracked_api_ids(api_name):
+    key_name = f"{api_name}_id"
+    paginator = _get_client().get_paginator("scan")
+
+    # The tracked index is sparse, only shows tracked for api_name are in
+    # it, and projects just the watermark and ttl
+    page_iterator = paginator.paginate(
+        TableName=DATABASE_NAME,
+        IndexName=f"{api_name}_tracked",
+        ProjectionExpression="#id, #api_id, #updated, #ttl",
+        ExpressionAttributeNames={
+            "#id": "id",
+            "#api_id": key_name,
+            "#updated": f"{api_name}_updated",
+            "#ttl": f"{api_name}_ttl",
+        },
+    )
+
+    tracked = {}
+    for p in page_iterator:
+        for i in p["Items"]:
+            tracked[int(i[key_name]["N"])] = {
+                "id": i["id"]["S"],
+                "updated": int(i.get(f"{api_name}_updated", {"N": "0"})["N"]),
+                "ttl": int(i[f"{api_name}_ttl"]["N"]) if f"{api_name}_ttl" in i else None,
+            }
+
+    log.debug("Found %s tracked %s shows", len(tracked), api_name)
+    return tracked
+
+
 def show_by_broadcast_generator(day_of_week, limit=100):
     paginator = _get_client().get_paginator('query')
 
@@ -107,4 +320,4 @@ def show_by_broadcast_generator(day_of_week, limit=100):
 
     for p in page_iterator:
         for i in p["Items"]:
-            yield json_util.loads(i)
+            yield dynamodb_items.loads(i, dynamodb_items.SHOW_ATTRIBUTES)
@@ -0,0 +1,90 @@
+import os
+import uuid
+
+import boto3
+from botocore.config import Config
+
+import concurrency
+import deadline
+import logger
+
+MAX_RECEIVES = 3
+# Sends also happen on the api read path, keep them well within its timeout
+CLIENT_CONFIG = Config(
+    connect_timeout=1,
+    read_timeout=float(os.getenv("SQS_READ_TIMEOUT", "2")),
+    retries={"max_attempts": 3},
+)
+
+log = logger.get_logger(__name__)
+
+client = None
+
+
+def _get_client():
+    global client
+
+    if client is None:
+        with concurrency.boto3_lock:
+            if client is None:
+                client = deadline.bind_client(boto3.client("sqs", config=CLIENT_CONFIG))
+
+    return client
+
+
+def get_queue(queue_url, consumer):
+    if queue_url:
+        return SqsQueue(queue_url)
+
+    log.info("No queue url configured, using an in-process queue")
+    return LocalQueue(consumer)
+
+
+class SqsQueue:
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+
+    def send(self, body):
+        _get_client().send_message(QueueUrl=self.queue_url, MessageBody=body)
+
+    def drain(self):
+        # Messages are delivered to the consumer lambda by SQS
+        pass
+
+
+# In-process stand-in for an SQS queue with a lambda consumer. The consumer
+# gets SQS shaped events and reports failures through batchItemFailures,
+# failed messages are redelivered up to MAX_RECEIVES times and then moved
+# to dead_letters.
+class LocalQueue:
+    def __init__(self, consumer, batch_size=1):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.messages = []
+        self.dead_letters = []
+
+    def send(self, body):
+        self.messages.append({"messageId": str(uuid.uuid4()), "body": body, "receives": 0})
+
+    def drain(self):
+        while self.messages:
+            batch = self.messages[:self.batch_size]
+            self.messages = self.messages[self.batch_size:]
+
+            for m in batch:
+                m["receives"] += 1
+
+            try:
+                res = self.consumer({"Records": [{"messageId": m["messageId"], "body": m["body"]} for m in batch]}, None)
+                failed_ids = {f["itemIdentifier"] for f in (res or {}).get("batchItemFailures", [])}
+            except Exception:
+                log.exception("Local queue consumer failed")
+                failed_ids = {m["messageId"] for m in batch}
+
+            for m in batch:
+                if m["messageId"] not in failed_ids:
+                    continue
+                if m["receives"] >= MAX_RECEIVES:
+                    self.dead_letters.append(m)
+                else:
+                    self.messages.append(m)
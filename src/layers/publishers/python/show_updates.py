@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+import logger
+import queues
+import shows_db
+import updates
+
+# Refresh requests go straight to the refresh consumer, not to the updates
+# topic subscribers
+REFRESH_QUEUE_URL = os.getenv("REFRESH_QUEUE_URL")
+REFRESH_INTERVAL = int(os.getenv("REFRESH_MIN_INTERVAL", str(5 * 60)))
+MAX_REQUESTED = 1000
+
+log = logger.get_logger(__name__)
+
+# (api_name, api_id) -> time of the last refresh request from this container
+requested = {}
+
+
+def chunk_message(api_name, entries):
+    return json.dumps({
+        "api_name": api_name,
+        "updates": entries,
+    })
+
+
+def process_chunk(api_name, entries):
+    published = []
+
+    with updates.BatchPublisher() as publisher:
+        for updated, api_id, show_id in entries:
+            # Skips shows an earlier run already published updated for
+            if not shows_db.mark_snapshot_stale(show_id, api_name, updated):
+                continue
+
+            publisher.publish_show_update(api_name, str(api_id))
+            published.append((show_id, updated))
+
+    # Only reached once everything is published, a failed publish leaves the
+    # watermarks behind so the redelivered chunk publishes again
+    for show_id, updated in published:
+        shows_db.save_updated(show_id, api_name, updated)
+
+    log.info("Published %s of %s %s updates", len(published), len(entries), api_name)
+    return len(published)
+
+
+def request_refresh(api_name, api_id, show_id):
+    if not REFRESH_QUEUE_URL:
+        log.debug("No refresh queue url configured, not requesting a refresh")
+        return False
+
+    key = (api_name, str(api_id))
+    now = time.time()
+
+    # Cheap in-process dedupe first, the conditional write dedupes across
+    # containers
+    if now - requested.get(key, 0) < REFRESH_INTERVAL:
+        return False
+
+    if len(requested) >= MAX_REQUESTED:
+        requested.clear()
+    requested[key] = now
+
+    if not shows_db.claim_refresh(show_id, api_name, REFRESH_INTERVAL):
+        return False
+
+    queues.SqsQueue(REFRESH_QUEUE_URL).send(updates.show_update_message(api_name, str(api_id)))
+    log.debug("Requested refresh for %s show: %s", api_name, api_id)
+    return True
+
+
+def handle_records(event, context):
+    failures = []
+
+    for record in event["Records"]:
+        try:
+            message = json.loads(record["body"])
+            process_chunk(message["api_name"], message["updates"])
+        except Exception:
+            log.exception("Failed to process updates chunk: %s", record['messageId'])
+            failures.append({"itemIdentifier": record["messageId"]})
+
+    return {"batchItemFailures": failures}
@@ -1,27 +1,132 @@
 import json
 import os
+import time
+from concurrent import futures
 
 import boto3
 
+import concurrency
+import logger
+
 TOPIC_ARN = os.getenv("UPDATES_TOPIC_ARN")
+BATCH_SIZE = 10
+MAX_WORKERS = 4
+MAX_RETRIES = 3
 
 topic = None
+client = None
+
+log = logger.get_logger(__name__)
+
+
+class Error(Exception):
+    pass
+
+
+class PublishError(Error):
+
+    def __init__(self, failed):
+        Error.__init__(self, f"Failed to publish {len(failed)} messages")
+        self.failed = failed
 
 
 def _get_topic():
     global topic
 
     if topic is None:
-        sns = boto3.resource("sns")
-        topic = sns.Topic(TOPIC_ARN)
+        with concurrency.boto3_lock:
+            if topic is None:
+                topic = boto3.resource("sns").Topic(TOPIC_ARN)
 
     return topic
 
 
+def _get_client():
+    global client
+
+    # Created from the publisher threads, boto3 sessions aren't thread safe
+    if client is None:
+        with concurrency.boto3_lock:
+            if client is None:
+                client = boto3.client("sns")
+
+    return client
+
+
+def show_update_message(api_name, api_id):
+    return json.dumps({
+        "api_name": api_name,
+        "api_id": api_id,
+    })
+
+
 def publish_show_update(api_name, api_id):
     _get_topic().publish(
-        Message=json.dumps({
-            "api_name": api_name,
-            "api_id": api_id,
-        })
+        Message=show_update_message(api_name, api_id)
     )
+
+
+class BatchPublisher:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.buffer = []
+        self.pending = []
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+    def publish_show_update(self, api_name, api_id):
+        self.buffer.append(show_update_message(api_name, api_id))
+        if len(self.buffer) >= BATCH_SIZE:
+            self._send_buffer()
+
+    def _send_buffer(self):
+        if self.buffer:
+            self.pending.append(self.executor.submit(_publish_batch, self.buffer))
+            self.buffer = []
+
+    def flush(self):
+        self._send_buffer()
+
+        failed = []
+        for f in self.pending:
+            failed.extend(f.result())
+        self.pending = []
+
+        if failed:
+            raise PublishError(failed)
+
+
+def _publish_batch(messages):
+    entries = {str(i): m for i, m in enumerate(messages)}
+    attempt = 0
+
+    while True:
+        res = _get_client().publish_batch(
+            TopicArn=TOPIC_ARN,
+            PublishBatchRequestEntries=[{"Id": i, "Message": m} for i, m in entries.items()]
+        )
+
+        failed = res.get("Failed", [])
+        retry = {f["Id"]: entries[f["Id"]] for f in failed if not f.get("SenderFault")}
+        permanent = [entries[f["Id"]] for f in failed if f.get("SenderFault")]
+
+        if permanent:
+            log.warning("%s messages rejected by SNS: %s", len(permanent), failed)
+
+        if not retry:
+            return permanent
+
+        attempt += 1
+        if attempt > MAX_RETRIES:
+            log.warning("Giving up on %s messages after %s retries", len(retry), MAX_RETRIES)
+            return permanent + list(retry.values())
+
+        entries = retry
+        time.sleep(min(0.1 * 2 ** attempt, 2))
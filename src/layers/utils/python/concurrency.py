@@ -0,0 +1,58 @@
+import os
+import threading
+from concurrent import futures
+
+MAX_WORKERS = int(os.getenv("CONCURRENCY_MAX_WORKERS", "8"))
+
+# boto3's default session isn't thread safe, lazy resource/client creation
+# in the database modules is serialised with this lock
+boto3_lock = threading.Lock()
+
+executor = None
+
+
+class Error(Exception):
+    pass
+
+
+class TimeoutError(Error):
+    pass
+
+
+def _get_executor():
+    global executor
+    if executor is None:
+        executor = futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    return executor
+
+
+def run_parallel(*calls, timeout=None):
+    pending = [_get_executor().submit(c) for c in calls]
+
+    _, not_done = futures.wait(pending, timeout=timeout)
+    if not_done:
+        for f in not_done:
+            f.cancel()
+        raise TimeoutError(f"{len(not_done)} of {len(calls)} calls did not finish in {timeout}s")
+
+    # Raise the first error in call order so callers can rely on precedence
+    return [f.result() for f in pending]
+
+
+def run_all(*calls, timeout=None):
+    pending = [_get_executor().submit(c) for c in calls]
+
+    futures.wait(pending, timeout=timeout)
+
+    # Unlike run_parallel every call gets an outcome, errors are returned in
+    # place of the result
+    results = []
+    for f in pending:
+        if not f.done():
+            f.cancel()
+            results.append(TimeoutError(f"Call did not finish in {timeout}s"))
+        elif f.exception() is not None:
+            results.append(f.exception())
+        else:
+            results.append(f.result())
+    return results
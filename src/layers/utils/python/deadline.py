@@ -0,0 +1,69 @@
+import os
+import time
+
+import concurrency
+
+# Seconds kept back from the lambda timeout to build and return a response
+SAFETY_MARGIN = float(os.getenv("DEADLINE_SAFETY_MARGIN", "0.5"))
+
+current = None
+
+
+class DeadlineExceeded(concurrency.TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, budget, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + budget
+
+    def remaining(self):
+        return self.expires_at - self.clock()
+
+    def timeout(self, default):
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded by {-remaining:.3f}s")
+        return min(default, remaining)
+
+
+def start(context, margin=SAFETY_MARGIN):
+    global current
+
+    # Local runs and tests have no lambda context, calls then keep their
+    # own timeouts
+    if context is None:
+        current = None
+    else:
+        current = Deadline(context.get_remaining_time_in_millis() / 1000 - margin)
+
+    return current
+
+
+def timeout(default):
+    if current is None:
+        return default
+    return current.timeout(default)
+
+
+def remaining():
+    if current is None:
+        return None
+    return current.remaining()
+
+
+def check():
+    if current is not None:
+        current.timeout(0)
+
+
+def _before_call(**kwargs):
+    check()
+
+
+def bind_client(client):
+    # botocore timeouts are fixed per client, instead fail fast in front of
+    # every call made once the deadline has passed
+    client.meta.events.register("before-call", _before_call)
+    return client
@@ -1,25 +1,49 @@
 import logging
 import os
+import random
 
 from pythonjsonlogger import jsonlogger
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Fraction of invocations logged at DEBUG regardless of LOG_LEVEL
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0"))
 
+handler = None
+loggers = {}
 
-def get_logger(name):
-    root = logging.getLogger()
-    if root.handlers:
-        for handler in root.handlers:
-            root.removeHandler(handler)
 
+def _get_handler():
+    global handler
+
+    if handler is None:
+        # Replace the lambda runtime handler with our json one, only once
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+
+        handler = logging.StreamHandler()
+        formatter = jsonlogger.JsonFormatter(
+            fmt='%(asctime)s %(levelname)s %(name)s %(message)s')
+        handler.setFormatter(formatter)
+
+    return handler
+
+
+def get_logger(name):
     logger = logging.getLogger(name)
-    logger.setLevel(LOG_LEVEL)
 
-    handler = logging.StreamHandler()
-    formatter = jsonlogger.JsonFormatter(
-        fmt='%(asctime)s %(levelname)s %(name)s %(message)s')
-    handler.setFormatter(formatter)
-    handler.setLevel(LOG_LEVEL)
-    logger.addHandler(handler)
+    if name not in loggers:
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(_get_handler())
+        loggers[name] = logger
 
     return logger
+
+
+def sample_debug():
+    if not DEBUG_SAMPLE_RATE:
+        return
+
+    level = logging.DEBUG if random.random() < DEBUG_SAMPLE_RATE else LOG_LEVEL
+    for logger in loggers.values():
+        logger.setLevel(level)
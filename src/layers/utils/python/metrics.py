@@ -0,0 +1,113 @@
+import functools
+import os
+import threading
+import time
+
+import logger
+
+NAMESPACE = os.getenv("METRICS_NAMESPACE", "show-service")
+FUNCTION_NAME = os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local")
+# EMF accepts at most 100 values per metric
+MAX_VALUES = 100
+
+log = logger.get_logger(__name__)
+
+cold_start = True
+lock = threading.Lock()
+# (dimensions, name) -> (unit, [values]), reset by flush
+values = {}
+
+
+class Span:
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.start = time.perf_counter()
+
+    def stop(self):
+        record(self.name, (time.perf_counter() - self.start) * 1000, "Milliseconds", **self.dimensions)
+
+
+class timer:
+    # Times the block as a span, dimensions can still be set on the yielded
+    # span before the block ends, e.g. once a cache lookup is done
+    def __init__(self, name, **dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.span = None
+
+    def __enter__(self):
+        self.span = Span(self.name, dict(self.dimensions))
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.span.stop()
+
+    def __call__(self, f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with timer(self.name, **self.dimensions):
+                return f(*args, **kwargs)
+        return wrapper
+
+
+def record(name, value, unit, **dimensions):
+    key = (tuple(sorted(dimensions.items())), name)
+    with lock:
+        if key not in values:
+            values[key] = (unit, [])
+        metric_values = values[key][1]
+        if len(metric_values) < MAX_VALUES:
+            metric_values.append(value)
+
+
+def count(name, value=1, **dimensions):
+    record(name, value, "Count", **dimensions)
+
+
+def flush():
+    global cold_start, values
+
+    with lock:
+        recorded, values = values, {}
+
+    base = {"function": FUNCTION_NAME, "cold_start": str(cold_start).lower()}
+    cold_start = False
+
+    groups = {}
+    for (dimensions, name), metric in recorded.items():
+        groups.setdefault(dimensions, {})[name] = metric
+
+    docs = []
+    for dimensions, metrics in groups.items():
+        doc = {**base, **dict(dimensions)}
+        doc["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [list(base) + [k for k, _ in dimensions]],
+                "Metrics": [{"Name": n, "Unit": unit} for n, (unit, _) in metrics.items()],
+            }],
+        }
+        for n, (_, metric_values) in metrics.items():
+            doc[n] = metric_values if len(metric_values) > 1 else metric_values[0]
+
+        # A dict message keeps _aws at the top level of the json record
+        log.info(doc)
+        docs.append(doc)
+
+    return docs
+
+
+def handler(name):
+    # Times the whole invocation and emits everything recorded during it
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(event, context):
+            try:
+                with timer(f"{name}.handler"):
+                    return f(event, context)
+            finally:
+                flush()
+        return wrapper
+    return decorator
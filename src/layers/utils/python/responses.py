@@ -0,0 +1,64 @@
+import decimal
+import json
+import re
+import uuid
+
+import metrics
+
+# Placeholder for RawJSON values, the random part keeps it from matching
+# strings in the data
+RAW_MARKER = uuid.uuid4().hex
+RAW_PATTERN = re.compile(f'"{RAW_MARKER}:([0-9]+)"')
+
+
+class RawJSON:
+    # Already serialised JSON, e.g. a stored snapshot, that is spliced into
+    # the output instead of being decoded and encoded again
+    def __init__(self, text):
+        self.text = text
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.text == other.text
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        if obj == obj.to_integral_value():
+            return int(obj)
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    raw = []
+
+    def default(o):
+        if isinstance(o, RawJSON):
+            raw.append(o.text)
+            return f"{RAW_MARKER}:{len(raw) - 1}"
+        return _default(o)
+
+    text = json.JSONEncoder(default=default).encode(obj)
+    if not raw:
+        return text
+
+    return RAW_PATTERN.sub(lambda m: raw[int(m.group(1))], text)
+
+
+def response(status_code, body=None, headers=None):
+    res = {"statusCode": status_code}
+
+    if headers:
+        res["headers"] = headers
+
+    if body is not None:
+        # Plain strings are sent as is
+        if isinstance(body, str):
+            res["body"] = body
+        else:
+            with metrics.timer("responses.dumps"):
+                res["body"] = dumps(body)
+
+    return res
@@ -1,20 +1,43 @@
 import json
+import threading
+
 import jsonschema
 
 import logger
+import metrics
 
 log = logger.get_logger(__name__)
 
+validators = {}
+validators_lock = threading.Lock()
+
+
 class ValidationException(Exception):
     pass
 
 
+def get_validator(path):
+    validator = validators.get(path)
+    if validator is not None:
+        return validator
+
+    with validators_lock:
+        if path not in validators:
+            with open(path, "r") as f:
+                schema = json.load(f)
+
+            cls = jsonschema.validators.validator_for(schema)
+            cls.check_schema(schema)
+            validators[path] = cls(schema)
+            log.debug("Compiled schema: %s", path)
+
+    return validators[path]
+
+
+@metrics.timer("schema.validate")
 def validate_schema(path, input_dict):
-    with open(path, "r") as f:
-        schema = json.load(f)
-
-    try:
-        jsonschema.validate(instance=input_dict, schema=schema)
-    except jsonschema.ValidationError as e:
-        log.warning(f"Validation error: {e}")
-        raise ValidationException(e.message)
+    # Same error selection as jsonschema.validate
+    error = jsonschema.exceptions.best_match(get_validator(path).iter_errors(input_dict))
+    if error is not None:
+        log.warning("Validation error: %s", error)
+        raise ValidationException(error.message)
@@ -0,0 +1,55 @@
+import json
+import timeit
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from dynamodb_json import json_util
+
+import dynamodb_items
+import responses
+
+SNAPSHOT = json.dumps({
+    "id": 1,
+    "name": "Lost",
+    "summary": "<p>After Oceanic Air flight 815...</p>" * 10,
+    "genres": ["Drama", "Adventure", "Supernatural"],
+    "rating": {"average": 8.2},
+})
+SHOW = {
+    "id": "6045673a-9dd2-451c-aa58-d94a217b993a",
+    "tvmaze_id": 1,
+    "ep_count": 121,
+    "special_count": 4,
+    "broadcast_day": "3",
+    "tvmaze_snapshot": SNAPSHOT,
+    "tvmaze_snapshot_version": 1,
+    "tvmaze_fetched_at": 1700000000,
+    "tvmaze_stale": False,
+    "tvmaze_updated": 1699990000,
+}
+serializer = TypeSerializer()
+ITEMS = [{k: serializer.serialize(v) for k, v in SHOW.items()} for _ in range(100)]
+NUMBER = 50
+
+
+def json_util_loads():
+    return responses.dumps([json_util.loads(i) for i in ITEMS])
+
+
+def table_resource():
+    deserializer = TypeDeserializer()
+    return responses.dumps([{k: deserializer.deserialize(v) for k, v in i.items()} for i in ITEMS])
+
+
+def raw_client():
+    return responses.dumps([dynamodb_items.loads(i, dynamodb_items.SHOW_ATTRIBUTES) for i in ITEMS])
+
+
+def main():
+    assert json.loads(json_util_loads()) == json.loads(raw_client()) == json.loads(table_resource())
+    for name, f in [("json_util", json_util_loads), ("table resource", table_resource), ("raw client", raw_client)]:
+        seconds = min(timeit.repeat(f, number=NUMBER, repeat=3))
+        print(f"{name}: {seconds / NUMBER * 1e3:.2f} ms per 100 items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import json
+import timeit
+from decimal import Decimal
+
+import responses
+
+SNAPSHOT = json.dumps({
+    "id": 1,
+    "name": "Lost",
+    "summary": "<p>After Oceanic Air flight 815...</p>" * 10,
+    "genres": ["Drama", "Adventure", "Supernatural"],
+    "schedule": {"time": "21:00", "days": ["Wednesday"]},
+    "rating": {"average": 8.2},
+    "_links": {"self": {"href": "https://api.tvmaze.com/shows/1"}},
+})
+SHOWS = [
+    {"id": str(i), "tvmaze_id": Decimal(i), "ep_count": Decimal(100), "tvmaze_snapshot": SNAPSHOT}
+    for i in range(200)
+]
+NUMBER = 50
+
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj)
+        return super().default(obj)
+
+
+def decoded():
+    shows = [{"id": s["id"], "tvmaze_id": s["tvmaze_id"], "ep_count": s["ep_count"],
+              "tvmaze_data": json.loads(s["tvmaze_snapshot"])} for s in SHOWS]
+    return {"statusCode": 200, "body": json.dumps({"shows": shows}, cls=DecimalEncoder)}
+
+
+def raw():
+    shows = [{"id": s["id"], "tvmaze_id": s["tvmaze_id"], "ep_count": s["ep_count"],
+              "tvmaze_data": responses.RawJSON(s["tvmaze_snapshot"])} for s in SHOWS]
+    return responses.response(200, {"shows": shows})
+
+
+def main():
+    assert json.loads(decoded()["body"]) == json.loads(raw()["body"])
+    for name, f in [("decoded", decoded), ("raw", raw)]:
+        seconds = min(timeit.repeat(f, number=NUMBER, repeat=3))
+        print(f"{name}: {seconds / NUMBER * 1e3:.2f} ms per 200 show response")
+
+
+if __name__ == "__main__":
+    main()
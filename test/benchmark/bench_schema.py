@@ -0,0 +1,33 @@
+import json
+import os
+import timeit
+
+import jsonschema
+
+import schema
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+SCHEMA_PATH = os.path.join(CURRENT_DIR, "..", "..", "src", "lambdas", "api", "episodes", "post.json")
+BODY = {"api_name": "tvmaze", "api_id": "123"}
+NUMBER = 2000
+
+
+def uncached():
+    with open(SCHEMA_PATH, "r") as f:
+        s = json.load(f)
+    jsonschema.validate(instance=BODY, schema=s)
+
+
+def cached():
+    schema.validate_schema(SCHEMA_PATH, BODY)
+
+
+def main():
+    for name, f in [("uncached", uncached), ("cached", cached)]:
+        f()
+        seconds = min(timeit.repeat(f, number=NUMBER, repeat=3))
+        print(f"{name}: {seconds / NUMBER * 1e6:.1f} us per validation")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,5 +20,17 @@ def mocked_episodes_db():
     import episodes_db
 
     episodes_db.table = MagicMock()
+    episodes_db.client = MagicMock()
 
     return episodes_db
+
+
+@pytest.fixture(scope='function')
+def mocked_updates():
+    import updates
+
+    updates.topic = MagicMock()
+    updates.client = MagicMock()
+    updates.client.publish_batch.return_value = {"Successful": [], "Failed": []}
+
+    return updates
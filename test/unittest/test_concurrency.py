@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+import concurrency
+
+
+def test_run_parallel_returns_results_in_order():
+    assert concurrency.run_parallel(lambda: 1, lambda: 2, lambda: 3) == [1, 2, 3]
+
+
+def test_run_parallel_runs_concurrently():
+    barrier = threading.Barrier(2, timeout=1)
+
+    def call(value):
+        barrier.wait()
+        return value
+
+    res = concurrency.run_parallel(lambda: call("a"), lambda: call("b"), timeout=2)
+
+    assert res == ["a", "b"]
+
+
+def test_run_parallel_raises_first_error_in_call_order():
+    def fail(e):
+        raise e
+
+    with pytest.raises(KeyError):
+        concurrency.run_parallel(lambda: fail(KeyError()), lambda: fail(ValueError()))
+
+
+def test_run_parallel_timeout():
+    with pytest.raises(concurrency.TimeoutError):
+        concurrency.run_parallel(lambda: time.sleep(0.5), timeout=0.01)
+
+
+def test_run_all_returns_errors_in_place():
+    def fail():
+        raise KeyError()
+
+    res = concurrency.run_all(lambda: 1, fail, lambda: time.sleep(0.5), timeout=0.1)
+
+    assert res[0] == 1
+    assert isinstance(res[1], KeyError)
+    assert isinstance(res[2], concurrency.TimeoutError)
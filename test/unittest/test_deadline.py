@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+
+import deadline
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def reset_deadline():
+    yield
+    deadline.current = None
+
+
+def test_deadline_timeout():
+    clock = Clock()
+    d = deadline.Deadline(2.0, clock=clock)
+
+    assert d.timeout(5) == 2.0
+    assert d.timeout(1) == 1
+
+    clock.now = 1.5
+    assert d.remaining() == 0.5
+
+    clock.now = 2.5
+    with pytest.raises(deadline.DeadlineExceeded):
+        d.timeout(1)
+
+
+def test_start_from_context():
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 3000
+
+    d = deadline.start(context, margin=0.5)
+
+    assert 2.4 < d.remaining() <= 2.5
+    assert 2.4 < deadline.timeout(10) <= 2.5
+
+
+def test_start_without_context():
+    deadline.start(None)
+
+    assert deadline.timeout(10) == 10
+    assert deadline.remaining() is None
+    deadline.check()
+
+
+def test_bind_client_fails_fast():
+    client = deadline.bind_client(boto3.client("dynamodb", region_name="eu-west-1"))
+    deadline.current = deadline.Deadline(-1)
+
+    with pytest.raises(deadline.DeadlineExceeded):
+        client.get_item(TableName="shows", Key={"id": {"S": "123"}})
@@ -0,0 +1,44 @@
+import pytest
+
+import dynamodb_items
+
+
+def test_loads_show():
+    item = {
+        "id": {"S": "123"},
+        "tvmaze_id": {"N": "1"},
+        "ep_count": {"N": "10"},
+        "tvmaze_snapshot": {"S": '{"id": 1}'},
+        "tvmaze_stale": {"BOOL": False},
+        "rating": {"N": "8.5"},
+        "genres": {"L": [{"S": "Drama"}, {"NULL": True}]},
+        "schedule": {"M": {"days": {"SS": ["Monday"]}, "time": {"N": "21"}}},
+    }
+
+    assert dynamodb_items.loads(item, dynamodb_items.SHOW_ATTRIBUTES) == {
+        "id": "123",
+        "tvmaze_id": 1,
+        "ep_count": 10,
+        "tvmaze_snapshot": '{"id": 1}',
+        "tvmaze_stale": False,
+        "rating": 8.5,
+        "genres": ["Drama", None],
+        "schedule": {"days": ["Monday"], "time": 21},
+    }
+
+
+def test_loads_unexpected_type():
+    item = {"tvmaze_id": {"S": "1"}}
+
+    assert dynamodb_items.loads(item, dynamodb_items.SHOW_ATTRIBUTES) == {"tvmaze_id": "1"}
+
+
+def test_loads_numbers():
+    item = {"a": {"N": "-3"}, "b": {"N": "1E+2"}, "c": {"NS": ["1", "2.5"]}}
+
+    assert dynamodb_items.loads(item) == {"a": -3, "b": 100.0, "c": [1, 2.5]}
+
+
+def test_loads_unsupported():
+    with pytest.raises(ValueError):
+        dynamodb_items.loads({"a": {"X": "1"}})
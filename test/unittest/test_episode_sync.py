@@ -0,0 +1,65 @@
+import episode_sync
+
+SHOW_ID = "60223a49-f9ec-4bd8-b90e-23a00cba6a58"
+
+
+def test_content_hash_ignores_key_order():
+    assert episode_sync.content_hash({"id": 1, "season": 1}) == episode_sync.content_hash({"season": 1, "id": 1})
+    assert episode_sync.content_hash({"id": 1, "season": 1}) != episode_sync.content_hash({"id": 1, "season": 2})
+
+
+def test_content_hash_ignores_unstored_fields():
+    episode = {"id": 1, "type": "regular", "season": 1, "number": 1}
+    changed = {**episode, "rating": {"average": 8.1}, "_links": {"self": {"href": "x"}}}
+
+    assert episode_sync.content_hash(episode) == episode_sync.content_hash(changed)
+
+
+def test_strip_episode():
+    assert episode_sync.strip_episode({"id": "a", "tvmaze_id": 1, "content_hash": "abc"}) == {"id": "a", "tvmaze_id": 1}
+
+
+def test_sync_writes_only_new_and_changed(mocked_episodes_db):
+    unchanged = {"id": 1, "season": 1, "number": 1}
+    changed = {"id": 2, "season": 1, "number": 3}
+    new = {"id": 3, "season": 1, "number": 2}
+    mocked_episodes_db.table.query.return_value = {"Items": [
+        {"tvmaze_id": 1, "content_hash": episode_sync.content_hash(unchanged)},
+        {"tvmaze_id": 2, "content_hash": "outdated"},
+    ]}
+    mocked_episodes_db.client.batch_write_item.return_value = {}
+
+    written = episode_sync.sync_episodes(SHOW_ID, "tvmaze", [unchanged, changed, new])
+
+    assert written == 2
+    requests = mocked_episodes_db.client.batch_write_item.call_args[1]["RequestItems"][mocked_episodes_db.DATABASE_NAME]
+    items = [r["PutRequest"]["Item"] for r in requests]
+    assert [i["tvmaze_id"]["N"] for i in items] == ["2", "3"]
+    assert items[1]["content_hash"]["S"] == episode_sync.content_hash(new)
+    assert items[1]["id"]["S"] == mocked_episodes_db.create_episode_uuid(SHOW_ID, "3")
+
+
+def test_sync_without_changes(mocked_episodes_db):
+    episode = {"id": 1, "name": "Pilot"}
+    mocked_episodes_db.table.query.return_value = {"Items": [
+        {"tvmaze_id": 1, "content_hash": episode_sync.content_hash(episode)},
+    ]}
+
+    assert episode_sync.sync_episodes(SHOW_ID, "tvmaze", [episode]) == 0
+    mocked_episodes_db.client.batch_write_item.assert_not_called()
+
+
+def test_sync_stores_episode_fields(mocked_episodes_db):
+    episode = {"id": 1, "type": "regular", "season": 1, "number": 2, "airdate": "2020-01-01", "runtime": 30}
+    mocked_episodes_db.table.query.return_value = {"Items": []}
+    mocked_episodes_db.client.batch_write_item.return_value = {}
+
+    episode_sync.sync_episodes(SHOW_ID, "tvmaze", [episode])
+
+    requests = mocked_episodes_db.client.batch_write_item.call_args[1]["RequestItems"][mocked_episodes_db.DATABASE_NAME]
+    item = requests[0]["PutRequest"]["Item"]
+    assert item["is_special"] == {"BOOL": False}
+    assert item["season"] == {"N": "1"}
+    assert item["number"] == {"N": "2"}
+    assert item["airdate"] == {"S": "2020-01-01"}
+    assert item["runtime"] == {"N": "30"}
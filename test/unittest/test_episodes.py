@@ -1,7 +1,11 @@
 import copy
 import json
+from unittest.mock import MagicMock
+
 import pytest
 
+import api.episodes
+import episode_sync
 from api.episodes import handle, UnsupportedMethod
 
 TEST_SHOW_UUID = "60223a49-f9ec-4bd8-b90e-23a00cba6a58"
@@ -56,6 +60,7 @@ class TestPost:
         mocked_episodes_db.table.query.return_value = {
             "Items": [
                 {
+                    "show_id": TEST_SHOW_UUID,
                     "id": "20e10800-b2e2-5079-90b5-243647854ef2",
                     "tvmaze_id": "456"
                 }
@@ -76,6 +81,26 @@ class TestPost:
         assert res_body["tvmaze_data"]["id"] == 456
         assert res_body["tvmaze_data"]["name"] == "The Waking Dead"  # From real tvmaze api
 
+    def test_fills_in_episode_fields(self, mocked_shows_db, mocked_episodes_db, monkeypatch):
+        tvmaze_api = MagicMock()
+        tvmaze_api.get_episode.return_value = {"id": 456, "type": "regular", "season": 1, "number": 3}
+        monkeypatch.setattr(api.episodes, "tvmaze_api", tvmaze_api)
+        mocked_episodes_db.table.query.return_value = {
+            "Items": [{"show_id": TEST_SHOW_UUID, "id": "abc", "tvmaze_id": 456, "season": 1}],
+            "Count": 1,
+        }
+        mocked_shows_db.table.get_item.return_value = {"Item": {"id": TEST_SHOW_UUID}}
+
+        res = handle(self.event, None)
+        res_body = json.loads(res["body"])
+
+        assert res["statusCode"] == 200
+        assert res_body["is_special"] is False
+        assert res_body["number"] == 3
+        update = mocked_episodes_db.table.update_item.call_args[1]
+        assert update["Key"] == {"show_id": TEST_SHOW_UUID, "id": "abc"}
+        assert update["ExpressionAttributeValues"] == {":is_special": False, ":number": 3}
+
     def test_no_body(self, mocked_shows_db, mocked_episodes_db):
         mocked_episodes_db.table.query.return_value = {
             "Items": [
@@ -166,6 +191,79 @@ class TestPost:
         assert res == exp
 
 
+class TestPostBulk:
+    event = {
+        "requestContext": {
+            "http": {
+                "method": "POST"
+            }
+        },
+        "pathParameters": {
+            "id": TEST_SHOW_UUID
+        },
+        "body": '{"api_ids": ["1", "2", "99"], "api_name": "tvmaze"}'
+    }
+
+    @pytest.fixture(autouse=True)
+    def tvmaze_api(self, monkeypatch):
+        tvmaze_api = MagicMock()
+        tvmaze_api.get_show_episodes.return_value = [{"id": 1}, {"id": 2}, {"id": 3}]
+        monkeypatch.setattr(api.episodes, "tvmaze_api", tvmaze_api)
+        return tvmaze_api
+
+    def test_success(self, mocked_shows_db, mocked_episodes_db, tvmaze_api):
+        mocked_episodes_db.client.batch_write_item.return_value = {}
+        # Episode 1 is stored and unchanged, it must keep its item as is
+        mocked_episodes_db.table.query.return_value = {
+            "Items": [{"tvmaze_id": 1, "content_hash": episode_sync.content_hash({"id": 1})}]
+        }
+        mocked_shows_db.table.get_item.return_value = {
+            "Item": {
+                "id": TEST_SHOW_UUID,
+                "tvmaze_id": 123
+            }
+        }
+
+        res = handle(self.event, None)
+        res_body = json.loads(res["body"])
+
+        assert res["statusCode"] == 200
+        assert [e["tvmaze_id"] for e in res_body["episodes"]] == [1, 2]
+        assert res_body["not_found"] == ["99"]
+        tvmaze_api.get_show_episodes.assert_called_once_with(123, cached=False)
+        requests = mocked_episodes_db.client.batch_write_item.call_args[1]["RequestItems"][mocked_episodes_db.DATABASE_NAME]
+        items = [r["PutRequest"]["Item"] for r in requests]
+        assert [i["tvmaze_id"]["N"] for i in items] == ["2"]
+        assert items[0]["content_hash"]["S"] == episode_sync.content_hash({"id": 2})
+
+    def test_all_episodes(self, mocked_shows_db, mocked_episodes_db):
+        mocked_episodes_db.client.batch_write_item.return_value = {}
+        mocked_episodes_db.table.query.return_value = {"Items": [{"tvmaze_id": 2, "content_hash": "abc"}]}
+        mocked_shows_db.table.get_item.return_value = {
+            "Item": {
+                "id": TEST_SHOW_UUID,
+                "tvmaze_id": 123
+            }
+        }
+        event = copy.deepcopy(self.event)
+        event["body"] = '{"all_episodes": true, "api_name": "tvmaze"}'
+
+        res = handle(event, None)
+        res_body = json.loads(res["body"])
+
+        assert res["statusCode"] == 200
+        assert [e["tvmaze_id"] for e in res_body["episodes"]] == [1, 2, 3]
+        assert res_body["not_found"] == []
+
+    def test_show_not_found(self, mocked_shows_db, mocked_episodes_db):
+        mocked_shows_db.table.get_item.return_value = {}
+
+        res = handle(self.event, None)
+
+        assert res["statusCode"] == 404
+        mocked_episodes_db.client.batch_write_item.assert_not_called()
+
+
 class TestGet:
     event = {
         "requestContext": {
@@ -199,6 +297,23 @@ class TestGet:
         assert res_body["tvmaze_data"]["id"]  == exp_res["tvmaze_id"]
         assert res_body["tvmaze_data"]["name"] == "The Waking Dead"  # From real tvmaze api
 
+    def test_lite_mode(self, mocked_shows_db, mocked_episodes_db, monkeypatch):
+        tvmaze_api = MagicMock()
+        monkeypatch.setattr(api.episodes, "tvmaze_api", tvmaze_api)
+        item = {"show_id": TEST_SHOW_UUID, "id": "123", "tvmaze_id": 456, "is_special": True, "season": 2, "number": 1}
+        mocked_episodes_db.table.query.return_value = {
+            "Items": [{**item, "content_hash": "abc", "tvmaze_refreshed": 1}],
+            "Count": 1,
+        }
+        event = copy.deepcopy(self.event)
+        event["queryStringParameters"]["mode"] = "lite"
+
+        res = handle(event, None)
+
+        assert res["statusCode"] == 200
+        assert json.loads(res["body"]) == item
+        tvmaze_api.get_episode.assert_not_called()
+
     def test_not_found(self, mocked_shows_db, mocked_episodes_db):
         mocked_episodes_db.table.query.side_effect = mocked_episodes_db.NotFoundError
 
@@ -255,3 +370,67 @@ class TestGet:
             "body": json.dumps({"error": "Unsupported api_name"})
         }
         assert res == exp
+
+
+class TestGetShowEpisodes:
+    event = {
+        "requestContext": {
+            "http": {
+                "method": "GET"
+            }
+        },
+        "pathParameters": {
+            "id": TEST_SHOW_UUID
+        },
+        "queryStringParameters": {
+            "limit": "2"
+        }
+    }
+
+    def test_success(self, mocked_shows_db, mocked_episodes_db):
+        mocked_episodes_db.table.query.return_value = {
+            "Items": [{"id": "1", "content_hash": "abc"}, {"id": "2"}],
+            "LastEvaluatedKey": {"show_id": TEST_SHOW_UUID, "id": "2"}
+        }
+
+        res = handle(self.event, None)
+        res_body = json.loads(res["body"])
+
+        assert res["statusCode"] == 200
+        assert res_body["episodes"] == [{"id": "1"}, {"id": "2"}]
+        assert mocked_episodes_db.decode_cursor(res_body["cursor"]) == {"show_id": TEST_SHOW_UUID, "id": "2"}
+        assert mocked_episodes_db.table.query.call_args[1]["Limit"] == 2
+
+    def test_last_page(self, mocked_shows_db, mocked_episodes_db):
+        mocked_episodes_db.table.query.return_value = {"Items": [{"id": "3"}]}
+
+        res = handle(self.event, None)
+
+        assert json.loads(res["body"]) == {"episodes": [{"id": "3"}], "cursor": None}
+
+    def test_show_not_found(self, mocked_shows_db, mocked_episodes_db):
+        mocked_episodes_db.table.query.return_value = {"Items": []}
+        mocked_shows_db.table.get_item.return_value = {}
+
+        res = handle(self.event, None)
+
+        assert res["statusCode"] == 404
+
+    def test_invalid_cursor(self, mocked_shows_db, mocked_episodes_db):
+        event = copy.deepcopy(self.event)
+        event["queryStringParameters"]["cursor"] = "abc"
+
+        res = handle(event, None)
+
+        assert res == {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Invalid cursor"})
+        }
+
+    def test_invalid_limit(self, mocked_shows_db, mocked_episodes_db):
+        event = copy.deepcopy(self.event)
+        event["queryStringParameters"]["limit"] = "1000"
+
+        res = handle(event, None)
+
+        assert res["statusCode"] == 400
@@ -1,3 +1,8 @@
+import json
+from unittest.mock import MagicMock
+
+import api.episodes_by_id
+import tvmaze
 from api.episodes_by_id import handle
 
 
@@ -52,3 +57,58 @@ def test_handler_invalid_amount(mocked_episodes_db):
 
     exp = {'statusCode': 404}
     assert res == exp
+
+
+def test_handler_serves_stale_tvmaze_data(mocked_episodes_db, monkeypatch):
+    error = tvmaze.CircuitOpenError()
+    error.stale_data = {"id": 2, "type": "regular"}
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_episode.side_effect = error
+    monkeypatch.setattr(api.episodes_by_id, "tvmaze_api", tvmaze_api)
+    mocked_episodes_db.table.query.return_value = {"Items": [{"id": "456", "tvmaze_id": 2}], "Count": 1}
+    event = {
+        "pathParameters": {
+            "id": "123",
+            "episode_id": "456"
+        },
+        "queryStringParameters": {
+            "api_name": "tvmaze"
+        }
+    }
+
+    res = handle(event, None)
+
+    assert res["statusCode"] == 200
+    body = json.loads(res["body"])
+    assert body["tvmaze_api"] == {"id": 2, "type": "regular"}
+    assert body["tvmaze_data_stale"] is True
+
+
+def test_handler_lite_mode(mocked_episodes_db, monkeypatch):
+    tvmaze_api = MagicMock()
+    monkeypatch.setattr(api.episodes_by_id, "tvmaze_api", tvmaze_api)
+    mocked_episodes_db.table.query.return_value = {
+        "Items": [{
+            "show_id": "123", "id": "456", "tvmaze_id": 2, "is_special": False, "season": 1, "number": 4,
+            "airdate": "2020-01-01", "runtime": 30, "content_hash": "abc", "title": "episode1",
+        }],
+        "Count": 1,
+    }
+    event = {
+        "pathParameters": {
+            "id": "123",
+            "episode_id": "456"
+        },
+        "queryStringParameters": {
+            "api_name": "tvmaze",
+            "mode": "lite"
+        }
+    }
+
+    res = handle(event, None)
+
+    assert res["statusCode"] == 200
+    assert list(json.loads(res["body"])) == [
+        "id", "show_id", "tvmaze_id", "is_special", "season", "number", "airdate", "runtime"
+    ]
+    tvmaze_api.get_episode.assert_not_called()
@@ -37,3 +37,85 @@ def test_get_episode_by_id_invalid_count(mocked_episodes_db):
 
     with pytest.raises(mocked_episodes_db.InvalidAmountOfEpisodes):
         mocked_episodes_db.get_episode_by_id("456", "123")
+
+
+def test_get_episode_by_id_raw_reads(mocked_episodes_db, monkeypatch):
+    monkeypatch.setattr(mocked_episodes_db, "RAW_READS", True)
+    mocked_episodes_db.client.query.return_value = {
+        "Items": [{"id": {"S": "123"}, "show_id": {"S": "456"}, "tvmaze_id": {"N": "1"}}],
+        "Count": 1
+    }
+
+    res = mocked_episodes_db.get_episode_by_id("456", "123")
+
+    assert res == {"id": "123", "show_id": "456", "tvmaze_id": 1}
+    mocked_episodes_db.table.query.assert_not_called()
+
+
+def test_episodes_generator(mocked_episodes_db):
+    mocked_episodes_db.table.query.side_effect = [
+        {"Items": [{"id": "1"}], "LastEvaluatedKey": {"show_id": "456", "id": "1"}},
+        {"Items": [{"id": "2"}]},
+    ]
+
+    pages = list(mocked_episodes_db.episodes_generator("456", limit=1))
+
+    assert pages == [
+        ([{"id": "1"}], {"show_id": "456", "id": "1"}),
+        ([{"id": "2"}], None),
+    ]
+    second_call = mocked_episodes_db.table.query.call_args_list[1][1]
+    assert second_call["ExclusiveStartKey"] == {"show_id": "456", "id": "1"}
+
+
+def test_get_episodes_page_cursor(mocked_episodes_db):
+    mocked_episodes_db.table.query.return_value = {
+        "Items": [{"id": "1"}],
+        "LastEvaluatedKey": {"show_id": "456", "id": "1"}
+    }
+
+    items, cursor = mocked_episodes_db.get_episodes_page("456", limit=1)
+    mocked_episodes_db.get_episodes_page("456", limit=1, cursor=cursor)
+
+    assert items == [{"id": "1"}]
+    assert mocked_episodes_db.decode_cursor(cursor) == {"show_id": "456", "id": "1"}
+    assert mocked_episodes_db.table.query.call_args[1]["ExclusiveStartKey"] == {"show_id": "456", "id": "1"}
+
+
+def test_get_episodes_page_other_show_cursor(mocked_episodes_db):
+    cursor = mocked_episodes_db.encode_cursor({"show_id": "789", "id": "1"})
+
+    with pytest.raises(mocked_episodes_db.InvalidCursorError):
+        mocked_episodes_db.get_episodes_page("456", cursor=cursor)
+
+
+def test_decode_invalid_cursor(mocked_episodes_db):
+    with pytest.raises(mocked_episodes_db.InvalidCursorError):
+        mocked_episodes_db.decode_cursor("not a cursor")
+
+
+def test_put_episodes(mocked_episodes_db):
+    show_id = "60223a49-f9ec-4bd8-b90e-23a00cba6a58"
+    table_name = mocked_episodes_db.DATABASE_NAME
+    mocked_episodes_db.client.batch_write_item.side_effect = [
+        {"UnprocessedItems": {table_name: [{"PutRequest": {"Item": {}}}]}},
+        {"UnprocessedItems": {}},
+        {},
+    ]
+    items = [
+        {"show_id": show_id, "id": mocked_episodes_db.create_episode_uuid(show_id, str(i)), "tvmaze_id": i}
+        for i in range(30)
+    ]
+
+    mocked_episodes_db.put_episodes(items)
+
+    calls = mocked_episodes_db.client.batch_write_item.call_args_list
+    assert len(calls) == 3
+    first = calls[0][1]["RequestItems"][table_name]
+    assert len(first) == 25
+    assert first[0]["PutRequest"]["Item"] == {
+        "show_id": {"S": show_id},
+        "id": {"S": items[0]["id"]},
+        "tvmaze_id": {"N": "0"},
+    }
+    assert len(calls[2][1]["RequestItems"][table_name]) == 5
@@ -0,0 +1,36 @@
+import logging
+
+import logger
+
+
+def test_get_logger_idempotent():
+    log = logger.get_logger("test_idempotent")
+    logger.get_logger("test_idempotent")
+    logger.get_logger("test_other")
+
+    assert log.handlers == [logger.handler]
+    assert logging.getLogger("test_other").handlers == [logger.handler]
+
+
+def test_sample_debug(monkeypatch):
+    log = logger.get_logger("test_sample")
+    monkeypatch.setattr(logger, "LOG_LEVEL", "INFO")
+    monkeypatch.setattr(logger, "DEBUG_SAMPLE_RATE", 0.5)
+
+    monkeypatch.setattr(logger.random, "random", lambda: 0.4)
+    logger.sample_debug()
+    assert log.isEnabledFor(logging.DEBUG)
+
+    monkeypatch.setattr(logger.random, "random", lambda: 0.6)
+    logger.sample_debug()
+    assert not log.isEnabledFor(logging.DEBUG)
+
+
+def test_sample_debug_disabled(monkeypatch):
+    log = logger.get_logger("test_sample_disabled")
+    monkeypatch.setattr(logger, "LOG_LEVEL", "INFO")
+    log.setLevel("INFO")
+
+    logger.sample_debug()
+
+    assert not log.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,82 @@
+import metrics
+
+
+def setup_function():
+    metrics.flush()
+
+
+def test_timer():
+    with metrics.timer("db.get", table="shows") as span:
+        span.dimensions["cache"] = "miss"
+
+    docs = metrics.flush()
+
+    assert len(docs) == 1
+    assert docs[0]["table"] == "shows"
+    assert docs[0]["cache"] == "miss"
+    assert docs[0]["db.get"] >= 0
+    assert docs[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["function", "cold_start", "cache", "table"]]
+    assert docs[0]["_aws"]["CloudWatchMetrics"][0]["Metrics"] == [{"Name": "db.get", "Unit": "Milliseconds"}]
+
+
+def test_timer_decorator():
+    @metrics.timer("work")
+    def work(a):
+        return a * 2
+
+    assert work(2) == 4
+    assert work(3) == 6
+
+    docs = metrics.flush()
+
+    assert len(docs[0]["work"]) == 2
+
+
+def test_count_grouped_by_dimensions():
+    metrics.count("calls", cache="hit")
+    metrics.count("calls", cache="hit")
+    metrics.count("calls", cache="miss")
+
+    docs = {d["cache"]: d for d in metrics.flush()}
+
+    assert docs["hit"]["calls"] == [1, 1]
+    assert docs["miss"]["calls"] == 1
+    assert docs["hit"]["_aws"]["CloudWatchMetrics"][0]["Metrics"] == [{"Name": "calls", "Unit": "Count"}]
+
+
+def test_max_values():
+    for _ in range(metrics.MAX_VALUES + 10):
+        metrics.count("calls")
+
+    assert len(metrics.flush()[0]["calls"]) == metrics.MAX_VALUES
+
+
+def test_handler_cold_start(monkeypatch):
+    flushed = []
+    monkeypatch.setattr(metrics, "log", type("Log", (), {"info": lambda self, doc: flushed.append(doc)})())
+    metrics.cold_start = True
+
+    @metrics.handler("test")
+    def handle(event, context):
+        return event
+
+    assert handle("event", None) == "event"
+    handle("event", None)
+
+    assert [d["cold_start"] for d in flushed] == ["true", "false"]
+
+
+def test_handler_flushes_on_error(monkeypatch):
+    @metrics.handler("test")
+    def handle(event, context):
+        raise ValueError()
+
+    flushed = []
+    monkeypatch.setattr(metrics, "log", type("Log", (), {"info": lambda self, doc: flushed.append(doc)})())
+
+    try:
+        handle("event", None)
+    except ValueError:
+        pass
+
+    assert "test.handler" in flushed[0]
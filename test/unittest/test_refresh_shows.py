@@ -0,0 +1,116 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+import events.refresh_shows
+import tvmaze
+from events.refresh_shows import handle
+
+SHOWS = {
+    "1": {"id": 1, "name": "Lost", "_embedded": {"episodes": [
+        {"id": 10, "type": "regular"},
+        {"id": 11, "type": "regular"},
+    ]}},
+    "2": {"id": 2, "name": "Twin Peaks", "_embedded": {"episodes": [
+        {"id": 20, "type": "insignificant_special"},
+    ]}},
+}
+
+
+class StubSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(url)
+        show_id = url.rsplit("/", 1)[-1]
+
+        res = MagicMock()
+        res.status_code = 200 if show_id in SHOWS else 500
+        res.json.return_value = SHOWS.get(show_id)
+        res.content = b"{}"
+        return res
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = StubSession()
+    api = tvmaze.TvMazeApi(session=session, bucket=MagicMock())
+    monkeypatch.setattr(events.refresh_shows, "tvmaze_api", api)
+    return session
+
+
+@pytest.fixture
+def shows(mocked_shows_db, mocked_episodes_db):
+    def query(**kwargs):
+        api_id = kwargs["KeyConditionExpression"].get_expression()["values"][1]
+        return {"Items": [{"id": mocked_shows_db.create_show_uuid("tvmaze", str(api_id)), "tvmaze_id": api_id}]}
+
+    mocked_shows_db.table.query.side_effect = query
+    mocked_episodes_db.table.query.return_value = {"Items": []}
+    mocked_episodes_db.client.batch_write_item.return_value = {}
+    return mocked_shows_db
+
+
+def _record(message_id, api_id, envelope=False):
+    body = json.dumps({"api_name": "tvmaze", "api_id": api_id})
+    if envelope:
+        body = json.dumps({"Type": "Notification", "Message": body})
+    return {"messageId": message_id, "body": body}
+
+
+def _saved(shows):
+    return {
+        c[1]["Key"]["id"]: c[1]["ExpressionAttributeValues"]
+        for c in shows.table.update_item.call_args_list
+    }
+
+
+def _show_id(shows, api_id):
+    return shows.create_show_uuid("tvmaze", api_id)
+
+
+def test_refreshes_snapshots_and_counts(session, shows, mocked_episodes_db):
+    res = handle({"Records": [_record("a", "1"), _record("b", "2", envelope=True)]}, None)
+
+    assert res == {"batchItemFailures": []}
+    saved = _saved(shows)
+    assert json.loads(saved[_show_id(shows, "1")][":tvmaze_snapshot"]) == {"id": 1, "name": "Lost"}
+    assert saved[_show_id(shows, "1")][":ep_count"] == 2
+    assert saved[_show_id(shows, "2")][":special_count"] == 1
+    written = [
+        r["PutRequest"]["Item"]["tvmaze_id"]["N"]
+        for c in mocked_episodes_db.client.batch_write_item.call_args_list
+        for r in c[1]["RequestItems"][mocked_episodes_db.DATABASE_NAME]
+    ]
+    assert sorted(written) == ["10", "11", "20"]
+
+
+def test_dedupes_within_batch(session, shows):
+    res = handle({"Records": [_record("a", "1"), _record("b", "1"), _record("c", 1)]}, None)
+
+    assert res == {"batchItemFailures": []}
+    assert len(session.calls) == 1
+    assert shows.table.update_item.call_count == 1
+
+
+def test_reports_partial_failures(session, shows):
+    res = handle({"Records": [
+        _record("a", "1"),
+        _record("b", "3"),
+        _record("c", "3"),
+        {"messageId": "d", "body": "invalid"},
+    ]}, None)
+
+    assert sorted(f["itemIdentifier"] for f in res["batchItemFailures"]) == ["b", "c", "d"]
+    assert list(_saved(shows)) == [_show_id(shows, "1")]
+
+
+def test_untracked_show_is_skipped(session, mocked_shows_db, mocked_episodes_db):
+    mocked_shows_db.table.query.return_value = {"Items": []}
+
+    res = handle({"Records": [_record("a", "1")]}, None)
+
+    assert res == {"batchItemFailures": []}
+    assert session.calls == []
@@ -0,0 +1,61 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from responses import RawJSON, dumps, response
+
+
+def test_dumps_decimal():
+    res = dumps({"int": Decimal("10"), "float": Decimal("8.5"), "neg": Decimal("-0.25")})
+
+    assert res == '{"int": 10, "float": 8.5, "neg": -0.25}'
+
+
+def test_dumps_set():
+    assert dumps({"ids": {"b", "a"}}) == '{"ids": ["a", "b"]}'
+
+
+def test_dumps_unsupported():
+    with pytest.raises(TypeError):
+        dumps({"obj": object()})
+
+
+def test_dumps_raw_json():
+    res = dumps({
+        "shows": [
+            {"id": "1", "tvmaze_data": RawJSON('{"id":1,"name":"Lost"}')},
+            {"id": "2", "tvmaze_data": RawJSON('{"id":2,"name":"Dark"}')},
+        ]
+    })
+
+    assert json.loads(res) == {
+        "shows": [
+            {"id": "1", "tvmaze_data": {"id": 1, "name": "Lost"}},
+            {"id": "2", "tvmaze_data": {"id": 2, "name": "Dark"}},
+        ]
+    }
+
+
+def test_dumps_raw_json_many():
+    res = dumps([RawJSON(str(i)) for i in range(12)])
+
+    assert json.loads(res) == list(range(12))
+
+
+def test_response():
+    assert response(200, {"id": "123"}) == {"statusCode": 200, "body": '{"id": "123"}'}
+
+
+def test_response_no_body():
+    assert response(404) == {"statusCode": 404}
+
+
+def test_response_str_body():
+    assert response(400, "Invalid post body") == {"statusCode": 400, "body": "Invalid post body"}
+
+
+def test_response_headers():
+    res = response(200, {}, headers={"Cache-Control": "max-age=60"})
+
+    assert res == {"statusCode": 200, "headers": {"Cache-Control": "max-age=60"}, "body": "{}"}
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+import schema
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+SCHEMA_PATH = os.path.join(CURRENT_DIR, "..", "..", "src", "lambdas", "api", "shows", "post.json")
+
+
+def test_validator_is_cached():
+    assert schema.get_validator(SCHEMA_PATH) is schema.get_validator(SCHEMA_PATH)
+
+
+def test_validate_schema():
+    schema.validate_schema(SCHEMA_PATH, {"api_name": "tvmaze", "api_id": "1"})
+
+
+def test_validate_schema_error():
+    with pytest.raises(schema.ValidationException) as e:
+        schema.validate_schema(SCHEMA_PATH, {"aa": "bb"})
+
+    assert str(e.value) == "Additional properties are not allowed ('aa' was unexpected)"
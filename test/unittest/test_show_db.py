@@ -1,4 +1,5 @@
 import pytest
+from botocore.exceptions import ClientError
 
 
 def test_get_show_by_tvmaze_id_not_found(mocked_shows_db):
@@ -16,4 +17,126 @@ def test_get_show_by_id_not_found(mocked_shows_db):
     }
 
     with pytest.raises(mocked_shows_db.NotFoundError):
-        mocked_shows_db.get_show_by_id("123")
\ No newline at end of file
+        mocked_shows_db.get_show_by_id("123")
+
+
+def test_get_show_by_id_hides_checkpoints(mocked_shows_db):
+    mocked_shows_db.table.get_item.return_value = {"Item": {"id": "checkpoint#update_eps"}}
+
+    with pytest.raises(mocked_shows_db.NotFoundError):
+        mocked_shows_db.get_show_by_id("checkpoint#update_eps")
+
+    assert mocked_shows_db.get_shows_by_ids(["checkpoint#update_eps"]) == []
+    mocked_shows_db.client.batch_get_item.assert_not_called()
+
+
+def test_get_show_by_id_raw_reads(mocked_shows_db, monkeypatch):
+    monkeypatch.setattr(mocked_shows_db, "RAW_READS", True)
+    mocked_shows_db.client.get_item.return_value = {
+        "Item": {"id": {"S": "123"}, "tvmaze_id": {"N": "1"}, "ep_count": {"N": "10"}}
+    }
+
+    assert mocked_shows_db.get_show_by_id("123") == {"id": "123", "tvmaze_id": 1, "ep_count": 10}
+    mocked_shows_db.table.get_item.assert_not_called()
+
+
+def test_save_snapshot(mocked_shows_db):
+    mocked_shows_db.save_snapshot("123", "tvmaze", {"id": 1, "rating": {"average": 8.5}})
+
+    values = mocked_shows_db.table.update_item.call_args[1]["ExpressionAttributeValues"]
+    assert values[":tvmaze_snapshot"] == '{"id": 1, "rating": {"average": 8.5}}'
+    assert values[":tvmaze_snapshot_version"] == mocked_shows_db.SNAPSHOT_VERSION
+    assert values[":tvmaze_stale"] is False
+
+
+def test_save_snapshot_ttl(mocked_shows_db):
+    mocked_shows_db.save_snapshot("123", "tvmaze", {"id": 1}, ttl=900)
+
+    values = mocked_shows_db.table.update_item.call_args[1]["ExpressionAttributeValues"]
+    assert values[":tvmaze_ttl"] == 900
+
+
+def test_get_snapshot(mocked_shows_db):
+    show = {
+        "id": "123",
+        "tvmaze_snapshot": '{"id": 1}',
+        "tvmaze_snapshot_version": mocked_shows_db.SNAPSHOT_VERSION,
+        "tvmaze_fetched_at": 100,
+    }
+
+    assert mocked_shows_db.get_snapshot(show, "tvmaze") == {
+        "data": {"id": 1},
+        "fetched_at": 100,
+        "stale": False,
+    }
+
+
+def test_get_snapshot_raw(mocked_shows_db):
+    show = {
+        "id": "123",
+        "tvmaze_snapshot": '{"id": 1}',
+        "tvmaze_snapshot_version": mocked_shows_db.SNAPSHOT_VERSION,
+        "tvmaze_fetched_at": 100,
+    }
+
+    assert mocked_shows_db.get_snapshot(show, "tvmaze", raw=True)["data"] == '{"id": 1}'
+
+
+def test_get_snapshot_old_version(mocked_shows_db):
+    show = {
+        "id": "123",
+        "tvmaze_snapshot": '{"id": 1}',
+        "tvmaze_snapshot_version": 0,
+        "tvmaze_fetched_at": 100,
+    }
+
+    assert mocked_shows_db.get_snapshot(show, "tvmaze") is None
+
+
+def test_claim_refresh(mocked_shows_db):
+    assert mocked_shows_db.claim_refresh("123", "tvmaze", 300)
+
+    kwargs = mocked_shows_db.table.update_item.call_args[1]
+    values = kwargs["ExpressionAttributeValues"]
+    assert kwargs["ExpressionAttributeNames"] == {"#requested": "tvmaze_refresh_requested_at"}
+    assert values[":cutoff"] == values[":now"] - 300
+
+
+def test_claim_refresh_already_claimed(mocked_shows_db):
+    mocked_shows_db.table.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+    )
+
+    assert not mocked_shows_db.claim_refresh("123", "tvmaze", 300)
+
+
+def test_get_shows_by_ids(mocked_shows_db):
+    show_ids = [str(i) for i in range(150)]
+    mocked_shows_db.client.batch_get_item.side_effect = [
+        {"Responses": {mocked_shows_db.DATABASE_NAME: [{"id": {"S": i}} for i in show_ids[:99]]},
+         "UnprocessedKeys": {mocked_shows_db.DATABASE_NAME: {"Keys": [{"id": {"S": "99"}}]}}},
+        {"Responses": {mocked_shows_db.DATABASE_NAME: [{"id": {"S": "99"}}]}},
+        {"Responses": {mocked_shows_db.DATABASE_NAME: [{"id": {"S": i}} for i in show_ids[100:]]}},
+    ]
+
+    res = mocked_shows_db.get_shows_by_ids(show_ids + ["0"])
+
+    assert [r["id"] for r in res] == show_ids
+    assert mocked_shows_db.client.batch_get_item.call_count == 3
+    first_keys = mocked_shows_db.client.batch_get_item.call_args_list[0][1]["RequestItems"]
+    assert len(first_keys[mocked_shows_db.DATABASE_NAME]["Keys"]) == 100
+
+
+def test_get_tracked_api_ids(mocked_shows_db):
+    mocked_shows_db.client.get_paginator.return_value.paginate.return_value = [
+        {"Items": [{"id": {"S": "a"}, "tvmaze_id": {"N": "1"}, "tvmaze_updated": {"N": "1000"}, "tvmaze_ttl": {"N": "900"}}]},
+        {"Items": [{"id": {"S": "b"}, "tvmaze_id": {"N": "2"}}]},
+    ]
+
+    assert mocked_shows_db.get_tracked_api_ids("tvmaze") == {
+        1: {"id": "a", "updated": 1000, "ttl": 900},
+        2: {"id": "b", "updated": 0, "ttl": None},
+    }
+    mocked_shows_db.client.get_paginator.assert_called_once_with("scan")
+    paginate = mocked_shows_db.client.get_paginator.return_value.paginate
+    assert paginate.call_args[1]["IndexName"] == "tvmaze_tracked"
@@ -0,0 +1,128 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+import show_updates
+import updates
+
+
+def _event(*bodies):
+    return {"Records": [{"messageId": str(i), "body": b} for i, b in enumerate(bodies)]}
+
+
+def test_process_chunk_skips_handled_updates(mocked_shows_db, mocked_updates):
+    conditional_failed = ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+    mocked_shows_db.table.update_item.side_effect = [None, conditional_failed, None]
+
+    published = show_updates.process_chunk("tvmaze", [[1000, 1, "a"], [1000, 2, "b"]])
+
+    assert published == 1
+    entries = mocked_updates.client.publish_batch.call_args[1]["PublishBatchRequestEntries"]
+    assert [json.loads(e["Message"])["api_id"] for e in entries] == ["1"]
+    calls = [c[1] for c in mocked_shows_db.table.update_item.call_args_list]
+    assert all("ConditionExpression" in c for c in calls)
+    # The watermark is moved last, only for the published show
+    assert calls[-1]["Key"] == {"id": "a"}
+    assert calls[-1]["ExpressionAttributeValues"] == {":tvmaze_updated": 1000}
+
+
+def test_process_chunk_keeps_watermark_on_publish_failure(mocked_shows_db, mocked_updates):
+    mocked_updates.client.publish_batch.return_value = {
+        "Failed": [{"Id": "0", "SenderFault": True}],
+    }
+
+    with pytest.raises(updates.PublishError):
+        show_updates.process_chunk("tvmaze", [[1000, 1, "a"]])
+
+    # Only the stale flag was written, the watermark is still behind
+    mocked_shows_db.table.update_item.assert_called_once()
+    assert mocked_shows_db.table.update_item.call_args[1]["UpdateExpression"] == "SET #stale = :stale"
+
+
+def test_handle_records_reports_failures(mocked_shows_db, mocked_updates):
+    res = show_updates.handle_records(_event(
+        show_updates.chunk_message("tvmaze", [[1000, 1, "a"]]),
+        "invalid",
+    ), None)
+
+    assert res == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+def test_local_queue_redelivers_failures():
+    import queues
+
+    calls = []
+
+    def consumer(event, context):
+        calls.append(event)
+        return {"batchItemFailures": [{"itemIdentifier": r["messageId"]} for r in event["Records"]]}
+
+    queue = queues.LocalQueue(consumer)
+    queue.send("a")
+    queue.drain()
+
+    assert len(calls) == queues.MAX_RECEIVES
+    assert [m["body"] for m in queue.dead_letters] == ["a"]
+
+
+def test_failed_publish_is_redelivered(mocked_shows_db, mocked_updates):
+    import queues
+
+    watermarks = {}
+
+    def update_item(Key, ExpressionAttributeValues, **kwargs):
+        show_id = Key["id"]
+        if ":updated" in ExpressionAttributeValues:
+            if watermarks.get(show_id, 0) >= ExpressionAttributeValues[":updated"]:
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        if ":tvmaze_updated" in ExpressionAttributeValues:
+            watermarks[show_id] = ExpressionAttributeValues[":tvmaze_updated"]
+
+    mocked_shows_db.table.update_item.side_effect = update_item
+    mocked_updates.client.publish_batch.side_effect = [
+        {"Failed": [{"Id": "0", "SenderFault": True}]},
+        {"Successful": [{"Id": "0"}], "Failed": []},
+    ]
+
+    queue = queues.LocalQueue(show_updates.handle_records)
+    queue.send(show_updates.chunk_message("tvmaze", [[1000, 1, "a"]]))
+    queue.drain()
+
+    assert mocked_updates.client.publish_batch.call_count == 2
+    assert queue.dead_letters == []
+    assert watermarks == {"a": 1000}
+
+
+@pytest.fixture
+def refresh_queue(monkeypatch):
+    import queues
+
+    monkeypatch.setattr(show_updates, "REFRESH_QUEUE_URL", "https://sqs/shows-refresh")
+    monkeypatch.setattr(show_updates, "requested", {})
+    monkeypatch.setattr(queues, "client", MagicMock())
+    return queues.client
+
+
+def test_request_refresh(mocked_shows_db, mocked_updates, refresh_queue):
+
+    assert show_updates.request_refresh("tvmaze", 1, "a")
+    # Deduped in process, no second conditional write
+    assert not show_updates.request_refresh("tvmaze", 1, "a")
+
+    mocked_shows_db.table.update_item.assert_called_once()
+    kwargs = refresh_queue.send_message.call_args[1]
+    assert kwargs["QueueUrl"] == "https://sqs/shows-refresh"
+    assert json.loads(kwargs["MessageBody"]) == {"api_name": "tvmaze", "api_id": "1"}
+    # Topic subscribers are not told about refreshes
+    mocked_updates.topic.publish.assert_not_called()
+
+
+def test_request_refresh_claimed_elsewhere(mocked_shows_db, refresh_queue):
+    mocked_shows_db.table.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+    )
+
+    assert not show_updates.request_refresh("tvmaze", 1, "a")
+    refresh_queue.send_message.assert_not_called()
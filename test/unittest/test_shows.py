@@ -196,3 +196,61 @@ class TestGet:
             "body": json.dumps({"error": "Unsupported api_name"})
         }
         assert res == exp
+
+
+class TestGetByIds:
+    event = {
+        "requestContext": {
+            "http": {
+                "method": "GET"
+            }
+        },
+        "queryStringParameters": {
+            "ids": "123,456",
+            "api_name": "tvmaze",
+        }
+    }
+
+    def test_success(self, mocked_shows_db):
+        mocked_shows_db.client.batch_get_item.return_value = {
+            "Responses": {
+                mocked_shows_db.DATABASE_NAME: [
+                    {
+                        "id": {"S": "123"},
+                        "tvmaze_id": {"N": "1"},
+                        "tvmaze_snapshot": {"S": '{"id": 1, "name": "Lost"}'},
+                        "tvmaze_snapshot_version": {"N": "1"},
+                        "tvmaze_fetched_at": {"N": "0"},
+                    }
+                ]
+            }
+        }
+
+        res = handle(self.event, None)
+
+        assert res["statusCode"] == 200
+        assert json.loads(res["body"]) == {
+            "shows": [
+                {"id": "123", "tvmaze_id": 1, "tvmaze_data": {"id": 1, "name": "Lost"}}
+            ],
+            "not_found": ["456"],
+        }
+
+    def test_too_many_ids(self, mocked_shows_db):
+        event = copy.deepcopy(self.event)
+        event["queryStringParameters"]["ids"] = ",".join(str(i) for i in range(201))
+
+        res = handle(event, None)
+
+        assert res["statusCode"] == 400
+
+    def test_empty_ids(self, mocked_shows_db):
+        event = copy.deepcopy(self.event)
+        event["queryStringParameters"]["ids"] = ""
+
+        res = handle(event, None)
+
+        assert res == {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Missing ids query parameter"})
+        }
@@ -1,5 +1,11 @@
+import json
+import time
+from unittest.mock import MagicMock
+
 import pytest
 
+import api.shows_by_id
+import deadline
 from api.shows_by_id import handle
 
 
@@ -33,3 +39,53 @@ def test_handler_not_found(mocked_shows_db):
 
     exp = {'statusCode': 404}
     assert res == exp
+
+
+def test_handler_serves_snapshot(mocked_shows_db, monkeypatch):
+    tvmaze_api = MagicMock()
+    monkeypatch.setattr(api.shows_by_id, "tvmaze_api", tvmaze_api)
+    mocked_shows_db.table.get_item.return_value = {
+        "Item": {
+            "id": "123",
+            "tvmaze_id": 1,
+            "tvmaze_snapshot": '{"id": 1, "name": "Lost"}',
+            "tvmaze_snapshot_version": 1,
+            "tvmaze_fetched_at": int(time.time()),
+            "ep_count": 1,
+            "special_count": 0,
+        }
+    }
+    event = {
+        "pathParameters": {
+            "id": "123"
+        },
+        "queryStringParameters": {
+            "api_name": "tvmaze"
+        }
+    }
+
+    res = handle(event, None)
+
+    assert res["statusCode"] == 200
+    assert json.loads(res["body"]) == {
+        "id": "123",
+        "tvmaze_id": 1,
+        "ep_count": 1,
+        "special_count": 0,
+        "tvmaze_data": {"id": 1, "name": "Lost"},
+    }
+    tvmaze_api.get_show.assert_not_called()
+    tvmaze_api.get_show_with_episodes.assert_not_called()
+
+
+def test_handler_deadline_exceeded(mocked_shows_db):
+    mocked_shows_db.table.get_item.side_effect = deadline.DeadlineExceeded()
+    event = {
+        "pathParameters": {
+            "id": "123"
+        }
+    }
+
+    res = handle(event, None)
+
+    assert res == {"statusCode": 504}
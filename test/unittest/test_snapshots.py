@@ -0,0 +1,171 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import snapshots
+import tvmaze
+
+
+def _show(fetched_at, stale=False):
+    return {
+        "id": "123",
+        "tvmaze_id": 1,
+        "tvmaze_snapshot": '{"id": 1, "name": "Lost"}',
+        "tvmaze_snapshot_version": 1,
+        "tvmaze_fetched_at": fetched_at,
+        "tvmaze_stale": stale,
+        "ep_count": 10,
+        "special_count": 2,
+    }
+
+
+def test_fresh_snapshot_is_served(mocked_shows_db):
+    tvmaze_api = MagicMock()
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, _show(int(time.time())), 1)
+
+    assert res == {"ep_count": 10, "special_count": 2, "tvmaze_data": {"id": 1, "name": "Lost"}}
+    tvmaze_api.get_show.assert_not_called()
+    tvmaze_api.get_show_with_episodes.assert_not_called()
+
+
+def test_old_snapshot_is_refreshed(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show.return_value = {"id": 1, "name": "Lost 2"}
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, _show(0), 1)
+
+    assert res == {"ep_count": 10, "special_count": 2, "tvmaze_data": {"id": 1, "name": "Lost 2"}}
+    mocked_shows_db.table.update_item.assert_called_once()
+    tvmaze_api.get_show_with_episodes.assert_not_called()
+
+
+def test_soft_expired_snapshot_is_revalidated(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    revalidate = MagicMock()
+
+    show = _show(int(time.time()) - tvmaze.RUNNING_TTL - 1)
+    res = snapshots.get_tvmaze_show(tvmaze_api, show, 1, revalidate=revalidate)
+
+    assert res == {"ep_count": 10, "special_count": 2, "tvmaze_data": {"id": 1, "name": "Lost"}}
+    revalidate.assert_called_once_with("tvmaze", 1, "123")
+    tvmaze_api.get_show.assert_not_called()
+
+
+def test_flagged_snapshot_is_revalidated(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    revalidate = MagicMock()
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, _show(int(time.time()), stale=True), 1, revalidate=revalidate)
+
+    assert res["tvmaze_data"] == {"id": 1, "name": "Lost"}
+    revalidate.assert_called_once()
+    tvmaze_api.get_show_with_episodes.assert_not_called()
+
+
+def test_failed_revalidation_still_serves(mocked_shows_db):
+    revalidate = MagicMock(side_effect=Exception("sns down"))
+
+    show = _show(int(time.time()) - tvmaze.RUNNING_TTL - 1)
+    res = snapshots.get_tvmaze_show(MagicMock(), show, 1, revalidate=revalidate)
+
+    assert res["tvmaze_data"] == {"id": 1, "name": "Lost"}
+
+
+def test_hard_expired_snapshot_is_refreshed(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show.return_value = {"id": 1, "name": "Lost 2"}
+    revalidate = MagicMock()
+
+    show = _show(int(time.time()) - snapshots.HARD_TTL - 1)
+    res = snapshots.get_tvmaze_show(tvmaze_api, show, 1, revalidate=revalidate)
+
+    assert res["tvmaze_data"] == {"id": 1, "name": "Lost 2"}
+    revalidate.assert_not_called()
+
+
+def test_stale_snapshot_is_refreshed(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show_with_episodes.return_value = ({"id": 1, "name": "Lost 2"}, {"ep_count": 11, "special_count": 2})
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, _show(int(time.time()), stale=True), 1)
+
+    assert res == {"ep_count": 11, "special_count": 2, "tvmaze_data": {"id": 1, "name": "Lost 2"}}
+    values = mocked_shows_db.table.update_item.call_args[1]["ExpressionAttributeValues"]
+    assert values[":ep_count"] == 11
+
+
+def test_missing_snapshot_is_fetched(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show_with_episodes.return_value = ({"id": 1}, {"ep_count": 1, "special_count": 0})
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, {"id": "123", "tvmaze_id": 1}, 1)
+
+    assert res == {"ep_count": 1, "special_count": 0, "tvmaze_data": {"id": 1}}
+    tvmaze_api.get_show_with_episodes.assert_called_once_with(1, cached=False)
+
+
+def test_strip_snapshot():
+    show = {**_show(0), "tvmaze_updated": 1000, "tvmaze_ttl": 900}
+    assert snapshots.strip_snapshot(show) == {"id": "123", "tvmaze_id": 1, "ep_count": 10, "special_count": 2}
+
+
+@pytest.mark.parametrize("code", [502, 503, 504])
+def test_snapshot_served_on_error(mocked_shows_db, code):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show.side_effect = tvmaze.HTTPError(code)
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, _show(0), 1)
+
+    assert res == {
+        "ep_count": 10,
+        "special_count": 2,
+        "tvmaze_data": {"id": 1, "name": "Lost"},
+        "tvmaze_data_stale": True,
+    }
+    mocked_shows_db.table.update_item.assert_not_called()
+
+
+def test_timeout_without_snapshot(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show_with_episodes.side_effect = tvmaze.HTTPError(504)
+
+    with pytest.raises(tvmaze.HTTPError):
+        snapshots.get_tvmaze_show(tvmaze_api, {"id": "123", "tvmaze_id": 1}, 1)
+
+
+def test_not_found_is_not_served_stale(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_show.side_effect = tvmaze.HTTPError(404)
+
+    with pytest.raises(tvmaze.HTTPError):
+        snapshots.get_tvmaze_show(tvmaze_api, _show(0), 1)
+
+
+def test_get_tvmaze_episode_stale():
+    tvmaze_api = MagicMock()
+    error = tvmaze.CircuitOpenError()
+    error.stale_data = {"id": 2}
+    tvmaze_api.get_episode.side_effect = error
+
+    assert snapshots.get_tvmaze_episode(tvmaze_api, 2) == ({"id": 2}, True)
+
+
+def test_get_tvmaze_episode_no_stale_data():
+    tvmaze_api = MagicMock()
+    tvmaze_api.get_episode.side_effect = tvmaze.HTTPError(502)
+
+    with pytest.raises(tvmaze.HTTPError):
+        snapshots.get_tvmaze_episode(tvmaze_api, 2)
+
+
+def test_ended_show_snapshot_stays_fresh(mocked_shows_db):
+    tvmaze_api = MagicMock()
+    show = _show(int(time.time()) - 2 * tvmaze.DAY)
+    show["tvmaze_snapshot"] = '{"id": 1, "status": "Ended"}'
+
+    res = snapshots.get_tvmaze_show(tvmaze_api, show, 1, revalidate=MagicMock())
+
+    assert res["tvmaze_data"] == {"id": 1, "status": "Ended"}
+    tvmaze_api.get_show.assert_not_called()
@@ -0,0 +1,61 @@
+from ttl_cache import TTLCache
+
+
+def test_get_missing():
+    cache = TTLCache(10, 100)
+
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired():
+    now = [0]
+    cache = TTLCache(10, 100, clock=lambda: now[0])
+    cache.set("a", 1, ttl=10)
+
+    assert cache.get("a") == (True, 1)
+    now[0] = 10
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_stale():
+    now = [0]
+    cache = TTLCache(10, 100, clock=lambda: now[0], stale_ttl=5)
+    cache.set("a", 1, ttl=10)
+
+    now[0] = 12
+    assert cache.get("a") == (False, None)
+    assert cache.get_stale("a") == (True, 1)
+
+    now[0] = 15
+    assert cache.get_stale("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(2, 100)
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2, ttl=10)
+    cache.get("a")
+    cache.set("c", 3, ttl=10)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_on_size():
+    cache = TTLCache(10, 100)
+    cache.set("a", 1, ttl=10, size=60)
+    cache.set("b", 2, ttl=10, size=60)
+
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["bytes"] == 60
+
+
+def test_skips_oversized_values():
+    cache = TTLCache(10, 100)
+    cache.set("a", 1, ttl=10, size=101)
+
+    assert cache.get("a") == (False, None)
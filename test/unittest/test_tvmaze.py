@@ -0,0 +1,366 @@
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+import deadline
+import metrics
+import ttl_cache
+import tvmaze
+
+
+def _response(status_code, json_data=None, headers=None):
+    res = MagicMock()
+    res.status_code = status_code
+    res.json.return_value = json_data
+    res.headers = headers or {}
+    res.content = b"{}"
+    return res
+
+
+def _api(*responses):
+    session = MagicMock()
+    session.get.side_effect = list(responses)
+    sleep = MagicMock()
+    api = tvmaze.TvMazeApi(session=session, bucket=MagicMock(), sleep=sleep)
+    return api, session, sleep
+
+
+def test_get_show_uses_session_with_timeout():
+    api, session, _ = _api(_response(200, {"id": 123}))
+
+    assert api.get_show(123) == {"id": 123}
+    session.get.assert_called_once_with(
+        "https://api.tvmaze.com/shows/123", params=None, timeout=tvmaze.REQUEST_TIMEOUT
+    )
+
+
+def test_get_show_not_found():
+    api, _, _ = _api(_response(404))
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 404
+
+
+def test_retry_after_on_429():
+    api, session, sleep = _api(
+        _response(429, headers={"Retry-After": "1"}),
+        _response(200, {"id": 1}),
+    )
+
+    assert api.get_episode(1) == {"id": 1}
+    assert session.get.call_count == 2
+    sleep.assert_called_once_with(1.0)
+    api.bucket.drain.assert_called_once()
+
+
+def test_gives_up_after_max_retries():
+    api, session, _ = _api(*[_response(429) for _ in range(tvmaze.MAX_RETRIES + 1)])
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_day_updates()
+    assert e.value.code == 429
+    assert session.get.call_count == tvmaze.MAX_RETRIES + 1
+
+
+def test_timeout():
+    api, _, _ = _api(requests.Timeout())
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 504
+
+
+def test_get_show_episodes_count():
+    api, _, _ = _api(_response(200, [{"type": "regular"}, {"type": "regular"}, {"type": "significant_special"}]))
+
+    assert api.get_show_episodes_count(1) == {"ep_count": 2, "special_count": 1}
+
+
+def test_get_show_with_episodes():
+    show = {
+        "id": 1,
+        "_embedded": {
+            "episodes": [{"type": "regular"}, {"type": "insignificant_special"}]
+        }
+    }
+    api, session, _ = _api(_response(200, show))
+
+    assert api.get_show_with_episodes(1) == ({"id": 1}, {"ep_count": 1, "special_count": 1})
+    session.get.assert_called_once_with(
+        "https://api.tvmaze.com/shows/1",
+        params={"embed": "episodes", "specials": 1},
+        timeout=tvmaze.REQUEST_TIMEOUT
+    )
+
+
+def test_responses_are_cached():
+    api, session, _ = _api(_response(200, {"id": 123}))
+
+    assert api.get_show(123) == {"id": 123}
+    assert api.get_show(123) == {"id": 123}
+    assert session.get.call_count == 1
+    assert api.cache.stats()["hits"] == 1
+    assert api.cache.stats()["misses"] == 1
+
+
+def test_uncached_get_skips_cache():
+    api, session, _ = _api(_response(200, {"id": 123, "name": "old"}), _response(200, {"id": 123, "name": "new"}))
+
+    api.get_show(123)
+    assert api.get_show(123, cached=False) == {"id": 123, "name": "new"}
+    # The fresh response replaces the cached one
+    assert api.get_show(123) == {"id": 123, "name": "new"}
+    assert session.get.call_count == 2
+
+
+def test_cache_dimension():
+    api, _, _ = _api(_response(200, {"id": 123}))
+    metrics.flush()
+
+    api.get_show(123)
+    api.get_show(123)
+
+    docs = {d["cache"]: d for d in metrics.flush()}
+    assert "tvmaze.show" in docs["hit"]
+    assert "tvmaze.show" in docs["miss"]
+
+
+def test_not_found_is_cached():
+    api, session, _ = _api(_response(404))
+
+    errors = []
+    for _ in range(2):
+        with pytest.raises(tvmaze.HTTPError) as e:
+            api.get_episode(1)
+        assert e.value.code == 404
+        errors.append(e.value)
+    assert session.get.call_count == 1
+    # A fresh error per hit, a shared one would grow its traceback
+    assert errors[0] is not errors[1]
+
+
+def test_server_errors_are_not_cached():
+    api, session, _ = _api(_response(500), _response(200, {"id": 1}))
+
+    with pytest.raises(tvmaze.HTTPError):
+        api.get_episode(1)
+    assert api.get_episode(1) == {"id": 1}
+    assert session.get.call_count == 2
+
+
+def test_token_bucket_waits_when_empty():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = tvmaze.TokenBucket(2, 10, clock=lambda: now[0], sleep=sleep)
+    bucket.acquire()
+    bucket.acquire()
+    bucket.acquire()
+
+    assert sleeps == [pytest.approx(5.0)]
+
+
+def test_token_bucket_wait_capped_by_timeout():
+    now = [0.0]
+    sleep = MagicMock()
+    bucket = tvmaze.TokenBucket(1, 10, clock=lambda: now[0], sleep=sleep)
+
+    assert bucket.acquire(1.0)
+    assert not bucket.acquire(1.0)
+    sleep.assert_not_called()
+
+
+def test_no_token_used_after_deadline(monkeypatch):
+    api, session, _ = _api(_response(200, {"id": 123}))
+    monkeypatch.setattr(deadline, "current", deadline.Deadline(-1))
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 504
+    api.bucket.acquire.assert_not_called()
+
+
+def test_no_token_wait_past_deadline(monkeypatch):
+    api, session, _ = _api(_response(200, {"id": 123}))
+    api.bucket.acquire.return_value = False
+    monkeypatch.setattr(deadline, "current", deadline.Deadline(1.0))
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 504
+    assert api.bucket.acquire.call_args[0][0] <= 1.0
+    session.get.assert_not_called()
+
+
+def test_request_timeout_capped_by_deadline(monkeypatch):
+    api, session, _ = _api(_response(200, {"id": 123}))
+    monkeypatch.setattr(deadline, "current", deadline.Deadline(1.0))
+
+    api.get_show(123)
+
+    assert session.get.call_args[1]["timeout"] <= 1.0
+
+
+def test_no_request_after_deadline(monkeypatch):
+    api, session, _ = _api(_response(200, {"id": 123}))
+    monkeypatch.setattr(deadline, "current", deadline.Deadline(-1))
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 504
+    session.get.assert_not_called()
+
+
+def test_rate_limit_retry_skipped_without_time(monkeypatch):
+    api, session, sleep = _api(_response(429, headers={"Retry-After": "3"}), _response(200, {"id": 123}))
+    monkeypatch.setattr(deadline, "current", deadline.Deadline(1.0))
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.code == 429
+    sleep.assert_not_called()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = Clock()
+    breaker = tvmaze.CircuitBreaker(2, 30, clock=clock)
+
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+
+    clock.now = 30
+    # Only a single trial call is let through while half open
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.allow()
+
+
+def test_circuit_breaker_trial_failure_reopens():
+    clock = Clock()
+    breaker = tvmaze.CircuitBreaker(1, 30, clock=clock)
+    breaker.record(False)
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+
+    clock.now = 59
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_is_open_keeps_trial():
+    clock = Clock()
+    breaker = tvmaze.CircuitBreaker(1, 30, clock=clock)
+    breaker.record(False)
+    assert breaker.is_open()
+
+    clock.now = 30
+    assert not breaker.is_open()
+    # Still available to the next allow
+    assert breaker.allow()
+    assert breaker.is_open()
+
+
+def test_circuit_opens_on_server_errors():
+    api, session, _ = _api(*[_response(500) for _ in range(tvmaze.BREAKER_FAILURES)])
+
+    for i in range(tvmaze.BREAKER_FAILURES):
+        with pytest.raises(tvmaze.HTTPError):
+            api.get_show(i)
+
+    with pytest.raises(tvmaze.CircuitOpenError) as e:
+        api.get_show(123)
+    assert e.value.code == 503
+    assert session.get.call_count == tvmaze.BREAKER_FAILURES
+    # Failed fast, without taking a token
+    assert api.bucket.acquire.call_count == tvmaze.BREAKER_FAILURES
+
+
+def test_not_found_keeps_circuit_closed():
+    api, session, _ = _api(*[_response(404) for _ in range(tvmaze.BREAKER_FAILURES + 1)])
+
+    for i in range(tvmaze.BREAKER_FAILURES + 1):
+        with pytest.raises(tvmaze.HTTPError) as e:
+            api.get_show(i)
+        assert e.value.code == 404
+
+
+def test_slow_calls_open_circuit(monkeypatch):
+    api, _, _ = _api(*[_response(200, {"id": i}) for i in range(tvmaze.BREAKER_FAILURES)])
+    monkeypatch.setattr(tvmaze, "SLOW_CALL_THRESHOLD", 0)
+
+    for i in range(tvmaze.BREAKER_FAILURES):
+        api.get_show(i)
+
+    with pytest.raises(tvmaze.CircuitOpenError):
+        api.get_show(123)
+
+
+def test_error_carries_stale_data():
+    clock = Clock()
+    cache = ttl_cache.TTLCache(10, 1000, clock=clock, stale_ttl=60)
+    session = MagicMock()
+    session.get.side_effect = [_response(200, {"id": 123}), _response(502)]
+    api = tvmaze.TvMazeApi(session=session, bucket=MagicMock(), cache=cache)
+
+    api.get_show(123)
+    clock.now = tvmaze.RUNNING_TTL + 1
+
+    with pytest.raises(tvmaze.HTTPError) as e:
+        api.get_show(123)
+    assert e.value.stale_data == {"id": 123}
+
+
+MONDAY = 1700438400  # 2023-11-20 00:00 UTC
+
+
+@pytest.mark.parametrize("show,ttl", [
+    ({"status": "Ended", "schedule": {"days": ["Monday"]}}, 7 * tvmaze.DAY),
+    ({"status": "To Be Determined"}, tvmaze.DAY),
+    ({"status": "Running", "schedule": {"days": ["Monday"]}}, tvmaze.AIRING_TTL),
+    ({"status": "Running", "schedule": {"days": ["Sunday"]}}, tvmaze.AIRING_TTL),
+    ({"status": "Running", "schedule": {"days": ["Thursday"]}, "updated": MONDAY}, tvmaze.RUNNING_TTL),
+    ({"status": "Running", "schedule": {"days": []}, "updated": MONDAY - 90 * tvmaze.DAY}, tvmaze.DORMANT_TTL),
+    ({}, tvmaze.RUNNING_TTL),
+])
+def test_show_ttl(show, ttl):
+    assert tvmaze.show_ttl(show, now=MONDAY + 3600) == ttl
+
+
+def test_show_cache_ttl_follows_status():
+    clock = Clock()
+    cache = ttl_cache.TTLCache(10, 1000, clock=clock)
+    session = MagicMock()
+    session.get.side_effect = [_response(200, {"id": 1, "status": "Ended"}), _response(200, {"id": 1})]
+    api = tvmaze.TvMazeApi(session=session, bucket=MagicMock(), cache=cache)
+
+    api.get_show(1)
+    clock.now = tvmaze.DAY
+    api.get_show(1)
+
+    assert session.get.call_count == 1
+
+
+def test_episode_fields():
+    episode = {"id": 1, "type": "significant_special", "season": 2, "number": None, "airdate": "2020-01-01", "runtime": 60}
+
+    assert tvmaze.episode_fields(episode) == {"is_special": True, "season": 2, "airdate": "2020-01-01", "runtime": 60}
+    assert tvmaze.episode_fields({"id": 1}) == {}
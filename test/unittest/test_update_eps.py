@@ -0,0 +1,157 @@
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import cron.update_eps
+import deadline
+from cron.update_eps import handle
+
+
+@pytest.fixture
+def tvmaze_api(monkeypatch):
+    tvmaze_api = MagicMock()
+    monkeypatch.setattr(cron.update_eps, "tvmaze_api", tvmaze_api)
+    return tvmaze_api
+
+
+@pytest.fixture
+def tracked(mocked_shows_db):
+    mocked_shows_db.client.get_paginator.return_value.paginate.return_value = [
+        {"Items": [
+            {"id": {"S": "a"}, "tvmaze_id": {"N": "1"}},
+            {"id": {"S": "c"}, "tvmaze_id": {"N": "3"}, "tvmaze_updated": {"N": "1000"}},
+            {"id": {"S": "d"}, "tvmaze_id": {"N": "4"}},
+        ]},
+    ]
+
+
+def _published(mocked_updates):
+    return [
+        json.loads(e["Message"])["api_id"]
+        for c in mocked_updates.client.publish_batch.call_args_list
+        for e in c[1]["PublishBatchRequestEntries"]
+    ]
+
+
+def _checkpoints(mocked_shows_db):
+    return [
+        c[1]["ExpressionAttributeValues"]
+        for c in mocked_shows_db.table.update_item.call_args_list
+        if c[1]["Key"]["id"] == "checkpoint#update_eps"
+    ]
+
+
+def test_handler(mocked_shows_db, mocked_updates, tvmaze_api, tracked):
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {"1": 1000, "2": 1000, "3": 2000, "4": 500}
+
+    handle(None, None)
+
+    tvmaze_api.get_updates.assert_called_once_with("day")
+    mocked_shows_db.table.query.assert_not_called()
+    assert sorted(_published(mocked_updates)) == ["1", "3", "4"]
+    assert [list(c) for c in _checkpoints(mocked_shows_db)] == [[":completed_at"]]
+
+
+def test_handler_prioritises_short_ttls(mocked_shows_db, mocked_updates, tvmaze_api, monkeypatch):
+    monkeypatch.setattr(cron.update_eps, "CHUNK_SIZE", 1)
+    mocked_shows_db.client.get_paginator.return_value.paginate.return_value = [
+        {"Items": [
+            {"id": {"S": "a"}, "tvmaze_id": {"N": "1"}, "tvmaze_ttl": {"N": "604800"}},
+            {"id": {"S": "b"}, "tvmaze_id": {"N": "2"}, "tvmaze_ttl": {"N": "900"}},
+            {"id": {"S": "c"}, "tvmaze_id": {"N": "3"}, "tvmaze_ttl": {"N": "43200"}},
+        ]},
+    ]
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {"1": 1000, "2": 3000, "3": 2000}
+
+    handle(None, None)
+
+    assert _published(mocked_updates) == ["2", "3", "1"]
+
+
+def test_handler_skips_already_published(mocked_shows_db, mocked_updates, tvmaze_api, tracked):
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {"3": 1000}
+
+    handle(None, None)
+
+    mocked_updates.client.publish_batch.assert_not_called()
+
+
+def test_handler_resumes_after_priorities_change(mocked_shows_db, mocked_updates, tvmaze_api):
+    # The interrupted run published show 1. Show 2 was never sent and its
+    # ttl dropped since, it sorts first now and must still be published.
+    mocked_shows_db.client.get_paginator.return_value.paginate.return_value = [
+        {"Items": [
+            {"id": {"S": "a"}, "tvmaze_id": {"N": "1"}, "tvmaze_ttl": {"N": "900"}, "tvmaze_updated": {"N": "5000"}},
+            {"id": {"S": "b"}, "tvmaze_id": {"N": "2"}, "tvmaze_ttl": {"N": "900"}, "tvmaze_updated": {"N": "1000"}},
+        ]},
+    ]
+    mocked_shows_db.table.get_item.return_value = {
+        "Item": {"id": "checkpoint#update_eps", "cursor": [900, 5000, 1]}
+    }
+    tvmaze_api.get_updates.return_value = {"1": 5000, "2": 4000}
+
+    handle(None, None)
+
+    assert _published(mocked_updates) == ["2"]
+    assert [list(c) for c in _checkpoints(mocked_shows_db)] == [[":completed_at"]]
+
+
+def test_handler_chunks(mocked_shows_db, mocked_updates, tvmaze_api, tracked, monkeypatch):
+    monkeypatch.setattr(cron.update_eps, "CHUNK_SIZE", 2)
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {"1": 1000, "3": 2000, "4": 500}
+
+    handle(None, None)
+
+    assert len(_checkpoints(mocked_shows_db)) == 1
+    assert mocked_updates.client.publish_batch.call_count == 2
+
+
+def test_handler_out_of_time(mocked_shows_db, mocked_updates, tvmaze_api, tracked, monkeypatch):
+    monkeypatch.setattr(cron.update_eps, "CHUNK_SIZE", 2)
+    monkeypatch.setattr(deadline, "remaining", MagicMock(side_effect=[1.0, 0]))
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {"1": 1000, "3": 2000, "4": 500}
+
+    handle(None, None)
+
+    # No completed_at, the next run plans the unsent updates again
+    assert _checkpoints(mocked_shows_db) == []
+    assert mocked_updates.client.publish_batch.call_count == 1
+
+
+@pytest.mark.parametrize("elapsed,since", [
+    (12 * 60 * 60, "day"),
+    (24 * 60 * 60, "day"),
+    (24 * 60 * 60 + 1, "week"),
+    (2 * 24 * 60 * 60, "week"),
+    (20 * 24 * 60 * 60, "month"),
+])
+def test_handler_catches_up(mocked_shows_db, mocked_updates, tvmaze_api, tracked, monkeypatch, elapsed, since):
+    now = 1700000000
+    monkeypatch.setattr(time, "time", lambda: now)
+    mocked_shows_db.table.get_item.return_value = {
+        "Item": {"id": "checkpoint#update_eps", "completed_at": now - elapsed}
+    }
+    tvmaze_api.get_updates.return_value = {}
+
+    handle(None, None)
+
+    tvmaze_api.get_updates.assert_called_once_with(since)
+
+
+def test_handler_saves_feed_fetch_time(mocked_shows_db, mocked_updates, tvmaze_api, tracked, monkeypatch):
+    clock = iter(range(1700000000, 1700000100, 10))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    mocked_shows_db.table.get_item.return_value = {}
+    tvmaze_api.get_updates.return_value = {}
+
+    handle(None, None)
+
+    # The time of the fetch, not of the end of the run
+    assert _checkpoints(mocked_shows_db) == [{":completed_at": 1700000010}]
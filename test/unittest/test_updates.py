@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+
+def test_publish_show_update(mocked_updates):
+    mocked_updates.publish_show_update("tvmaze", "123")
+
+    mocked_updates.topic.publish.assert_called_once_with(
+        Message=json.dumps({"api_name": "tvmaze", "api_id": "123"})
+    )
+
+
+def test_batch_publisher_groups_messages(mocked_updates):
+    with mocked_updates.BatchPublisher() as publisher:
+        for i in range(25):
+            publisher.publish_show_update("tvmaze", str(i))
+
+    calls = mocked_updates.client.publish_batch.call_args_list
+    assert sorted(len(c[1]["PublishBatchRequestEntries"]) for c in calls) == [5, 10, 10]
+    messages = [e["Message"] for c in calls for e in c[1]["PublishBatchRequestEntries"]]
+    assert sorted(json.loads(m)["api_id"] for m in messages) == sorted(str(i) for i in range(25))
+
+
+def test_batch_publisher_retries_failed_entries(mocked_updates):
+    mocked_updates.client.publish_batch.side_effect = [
+        {"Successful": [{"Id": "0"}], "Failed": [{"Id": "1", "SenderFault": False}]},
+        {"Successful": [{"Id": "1"}], "Failed": []},
+    ]
+
+    with mocked_updates.BatchPublisher() as publisher:
+        publisher.publish_show_update("tvmaze", "1")
+        publisher.publish_show_update("tvmaze", "2")
+
+    retry = mocked_updates.client.publish_batch.call_args_list[1][1]["PublishBatchRequestEntries"]
+    assert retry == [{"Id": "1", "Message": json.dumps({"api_name": "tvmaze", "api_id": "2"})}]
+
+
+def test_batch_publisher_raises_on_sender_fault(mocked_updates):
+    mocked_updates.client.publish_batch.return_value = {
+        "Successful": [],
+        "Failed": [{"Id": "0", "SenderFault": True}]
+    }
+
+    with pytest.raises(mocked_updates.PublishError) as e:
+        with mocked_updates.BatchPublisher() as publisher:
+            publisher.publish_show_update("tvmaze", "1")
+
+    assert len(e.value.failed) == 1
+    mocked_updates.client.publish_batch.assert_called_once()